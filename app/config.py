@@ -4,14 +4,18 @@ from dotenv import load_dotenv
 load_dotenv()
 UPLOAD_DIR = "./uploads"
 PERSIST_DIR = "./storage"
+CACHE_DIR = "./cache"
 
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(PERSIST_DIR, exist_ok=True)
 
 COLLECTION_NAME = os.getenv("COLLECTION_NAME", "documents")
-USE_QDRANT = os.getenv("USE_QDRANT", "True") == "True"
+USE_QDRANT = os.getenv("USE_QDRANT", "True") == "True"  # False: Qdrant embebido en el proceso, sin servidor
+QDRANT_LOCAL_PATH = os.getenv("QDRANT_LOCAL_PATH", os.path.join(PERSIST_DIR, "qdrant_local"))
 QDRANT_HOST = os.getenv("QDRANT_HOST", "localhost")
 QDRANT_PORT = int(os.getenv("QDRANT_PORT", 6333))
+QDRANT_GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", 6334))
+QDRANT_PREFER_GRPC = os.getenv("QDRANT_PREFER_GRPC", "False") == "True"
 
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 OPENAI_API_KEY=os.getenv("OPENAI_API_KEY")
@@ -19,4 +23,68 @@ DEVICE = os.getenv("DEVICE", "cpu")
 LLM_PROVIDER = os.getenv("LLM_PROVIDER", "groq")
 EMBEDDING_PROVIDER=os.getenv("EMBEDDING_PROVIDER", "huggingface")  
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "hkunlp/instructor-base")
-LLM_MODEL = os.getenv("LLM_MODEL", "llama3-8b-8192")
\ No newline at end of file
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", 768))  # debe coincidir con la colección existente
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", 0))  # fastembed/onnx; 0 = automático
+EMBEDDING_QUANTIZE = os.getenv("EMBEDDING_QUANTIZE", "False") == "True"  # onnx: cuantización int8
+LLM_MODEL = os.getenv("LLM_MODEL", "llama3-8b-8192")
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "True") == "True"  # cargar modelos en segundo plano al arrancar
+
+# Ingesta
+INGEST_PARSE_WORKERS = int(os.getenv("INGEST_PARSE_WORKERS", os.cpu_count() or 1))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", 64))
+PARSE_PAGES_PER_TASK = int(os.getenv("PARSE_PAGES_PER_TASK", 32))  # páginas por tarea de parseo (memoria acotada)
+INGEST_JOB_WORKERS = int(os.getenv("INGEST_JOB_WORKERS", 2))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", 16))
+INGEST_JOBS_RETAINED = int(os.getenv("INGEST_JOBS_RETAINED", 200))
+
+# Cache de respuestas
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "True") == "True"
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", 1000))
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", 3600))  # segundos, 0 = sin expiración
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", 0))  # ej: 0.95; 0 = solo coincidencia exacta
+
+# Cache de embeddings
+EMBED_CACHE_ENABLED = os.getenv("EMBED_CACHE_ENABLED", "True") == "True"
+EMBED_CACHE_MAX_ENTRIES = int(os.getenv("EMBED_CACHE_MAX_ENTRIES", 20000))  # ~3 KB por entrada (768 dims, float32): ~60 MB
+EMBED_CACHE_PERSIST = os.getenv("EMBED_CACHE_PERSIST", "False") == "True"  # guarda los vectores en CACHE_DIR
+EMBED_MICROBATCH_WAIT_MS = float(os.getenv("EMBED_MICROBATCH_WAIT_MS", 5))  # 0 desactiva los micro-lotes
+
+# Planificador de llamadas al LLM (resúmenes en paralelo)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 4))
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", 30))  # cuota del proveedor, 0 = sin límite
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", 0))  # cuota del proveedor, 0 = sin límite
+LLM_TOKENS_PER_REQUEST = int(os.getenv("LLM_TOKENS_PER_REQUEST", 2000))  # estimación por tarea para el límite de tokens
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 5))  # reintentos ante 429
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", 1))  # segundos
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", 30))  # segundos
+
+# Resúmenes map-reduce (sin índice vectorial)
+SUMMARY_CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", 3000))  # tokens de texto por llamada al LLM
+SUMMARY_MAX_LEVELS = int(os.getenv("SUMMARY_MAX_LEVELS", 4))  # niveles máximos del árbol de reducción
+RELATION_CONTEXT_TOKENS = int(os.getenv("RELATION_CONTEXT_TOKENS", 6000))  # resúmenes por llamada al analizar relaciones
+RELATION_GRAPH_MIN_DOCS = int(os.getenv("RELATION_GRAPH_MIN_DOCS", 8))  # desde cuántos documentos se pre-agrupan por similitud
+RELATION_SIMILARITY_THRESHOLD = float(os.getenv("RELATION_SIMILARITY_THRESHOLD", 0.8))  # similitud coseno entre centroides
+RELATION_CLUSTER_MAX_SIZE = int(os.getenv("RELATION_CLUSTER_MAX_SIZE", 12))  # documentos por cluster; los más grandes se dividen
+
+# Recorrido completo de la colección (scroll paginado de Qdrant)
+CORPUS_SCROLL_PAGE_SIZE = int(os.getenv("CORPUS_SCROLL_PAGE_SIZE", 256))
+
+# Recuperación híbrida (BM25 + vectores, fusionados con reciprocal rank fusion)
+BM25_K1 = float(os.getenv("BM25_K1", 1.2))
+BM25_B = float(os.getenv("BM25_B", 0.75))
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", 60))
+
+# Reranking con un cross-encoder local y empaquetado del contexto por presupuesto de tokens
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "False") == "True"  # valor por defecto de /query?rerank=
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")  # multilingüe, corre en CPU
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", 40))  # chunks que se piden a Qdrant antes de re-puntuar
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", 16))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 1500))  # tokens de contexto que llegan al LLM
+
+# Observabilidad: tiempos por etapa en /metrics (formato Prometheus) y spans de OpenTelemetry
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "True") == "True"
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "False") == "True"  # requiere opentelemetry-api (y un SDK/exportador)
+
+# Multi-tenant: cada tenant (header X-Tenant-ID) tiene su propia colección, PDFs, manifiesto e índices
+DEFAULT_TENANT = os.getenv("DEFAULT_TENANT", "default")  # usa COLLECTION_NAME, UPLOAD_DIR y PERSIST_DIR tal cual
+TENANT_CACHE_SIZE = int(os.getenv("TENANT_CACHE_SIZE", 16))  # tenants con índices y caches en memoria (LRU)
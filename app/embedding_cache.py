@@ -0,0 +1,219 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, List
+
+import numpy as np
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.embeddings import BaseEmbedding
+
+
+class _MicroBatcher:
+    """
+    Agrupa pedidos concurrentes de un solo texto en lotes: espera hasta `max_wait_ms`
+    (o hasta juntar `max_batch` textos) y llama una sola vez a `batch_fn`.
+    """
+
+    def __init__(self, batch_fn, max_batch, max_wait_ms):
+        self._batch_fn = batch_fn
+        self._max_batch = max_batch
+        self._max_wait = max_wait_ms / 1000
+        self._pending = []
+        self._cond = threading.Condition()
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def submit(self, text):
+        future = Future()
+        with self._cond:
+            self._pending.append((text, future))
+            self._cond.notify()
+        return future.result()
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                deadline = time.monotonic() + self._max_wait
+                while len(self._pending) < self._max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._pending[:self._max_batch]
+                del self._pending[:self._max_batch]
+            try:
+                vectors = self._batch_fn([text for text, _ in batch])
+                for (_, future), vector in zip(batch, vectors):
+                    future.set_result(vector)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+
+
+class _SqliteEmbeddingStore:
+    """Almacén en disco de embeddings (clave -> vector float32) para sobrevivir reinicios."""
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB)")
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, items):
+        rows = [(key, vector.tobytes()) for key, vector in items]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows)
+            self._conn.commit()
+
+
+class CachedEmbedding(BaseEmbedding):
+    """
+    Envoltorio de un modelo de embeddings que:
+    - memoriza vectores por hash del texto en un LRU acotado en memoria (arrays float32:
+      ~3 KB por entrada con 768 dimensiones; como lista de floats de Python serían ~25 KB),
+    - opcionalmente los guarda en disco (sqlite) para que reinicios y re-ingestas
+      no recalculen chunks ya vistos,
+    - agrupa pedidos concurrentes de un solo texto en micro-lotes.
+    Queries y textos se cachean por separado porque algunos modelos (instructor)
+    les anteponen instrucciones distintas. `backend` (proveedor y cuantización) entra en la
+    clave: el mismo modelo en huggingface, onnx u onnx int8 no genera exactamente los mismos vectores.
+    """
+
+    _base: BaseEmbedding = PrivateAttr()
+    _lru: OrderedDict = PrivateAttr()
+    _max_entries: int = PrivateAttr()
+    _lock: Any = PrivateAttr()
+    _store: Any = PrivateAttr()
+    _batchers: dict = PrivateAttr()
+    _counters: dict = PrivateAttr()
+    _backend: str = PrivateAttr()
+
+    def __init__(self, base, max_entries=10000, store_path=None, microbatch_wait_ms=0, backend="", **kwargs):
+        super().__init__(model_name=base.model_name, embed_batch_size=base.embed_batch_size, **kwargs)
+        self._base = base
+        self._backend = backend
+        self._lru = OrderedDict()
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._store = _SqliteEmbeddingStore(store_path) if store_path else None
+        self._batchers = {}
+        if microbatch_wait_ms > 0:
+            self._batchers = {
+                kind: _MicroBatcher(self._batch_fn(kind), base.embed_batch_size, microbatch_wait_ms)
+                for kind in ("query", "text")
+            }
+        self._counters = {"hits": 0, "disk_hits": 0, "misses": 0}
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    def _batch_fn(self, kind):
+        if kind == "text":
+            return self._base._get_text_embeddings
+        # HuggingFaceEmbedding expone _embed con el prompt de query; otros modelos se llaman de a uno
+        if hasattr(self._base, "_embed"):
+            return lambda queries: self._base._embed(queries, prompt_name="query")
+        return lambda queries: [self._base._get_query_embedding(q) for q in queries]
+
+    def _key(self, kind, text):
+        return hashlib.sha256(f"{self._backend}\x00{self.model_name}\x00{kind}\x00{text}".encode("utf-8")).hexdigest()
+
+    def _get_many(self, texts: List[str], kind: str) -> List[List[float]]:
+        keys = [self._key(kind, text) for text in texts]
+        results = [None] * len(texts)
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._lru.get(key)
+                if vector is not None:
+                    self._lru.move_to_end(key)
+                    results[i] = vector
+                    self._counters["hits"] += 1
+
+        missing = [i for i, vector in enumerate(results) if vector is None]
+        if missing and self._store is not None:
+            found = self._store.get_many([keys[i] for i in missing])
+            disk_hits = [i for i in missing if keys[i] in found]
+            for i in disk_hits:
+                results[i] = found[keys[i]]
+            self._remember([(keys[i], found[keys[i]]) for i in disk_hits])
+            with self._lock:
+                self._counters["disk_hits"] += len(disk_hits)
+            missing = [i for i in missing if results[i] is None]
+
+        if missing:
+            # Textos repetidos dentro del mismo lote se calculan una sola vez
+            positions = OrderedDict()
+            for i in missing:
+                positions.setdefault(keys[i], []).append(i)
+            unique_texts = [texts[indexes[0]] for indexes in positions.values()]
+            vectors = [np.asarray(vector, dtype=np.float32) for vector in self._compute(unique_texts, kind)]
+            computed = list(zip(positions.keys(), vectors))
+            for (key, vector), indexes in zip(computed, positions.values()):
+                for i in indexes:
+                    results[i] = vector
+            with self._lock:
+                self._counters["misses"] += len(unique_texts)
+            self._remember(computed)
+            if self._store is not None:
+                self._store.put_many(computed)
+        # Solo la respuesta se convierte a lista (lo que espera LlamaIndex); el cache guarda float32
+        return [vector.tolist() for vector in results]
+
+    def _compute(self, texts, kind):
+        if len(texts) == 1 and self._batchers:
+            return [self._batchers[kind].submit(texts[0])]
+        return self._batch_fn(kind)(texts)
+
+    def _remember(self, items):
+        with self._lock:
+            for key, vector in items:
+                self._lru[key] = vector
+                self._lru.move_to_end(key)
+            while len(self._lru) > self._max_entries:
+                self._lru.popitem(last=False)
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._get_many([query], "query")[0]
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return await asyncio.to_thread(self._get_query_embedding, query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._get_many([text], "text")[0]
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return await asyncio.to_thread(self._get_text_embedding, text)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self._get_many(texts, "text")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._lru),
+                "max_entries": self._max_entries,
+                "persistent": self._store is not None,
+                "microbatching": bool(self._batchers),
+                **self._counters,
+            }
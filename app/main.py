@@ -1,11 +1,22 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import os
-from app.routes import upload_routes, query_routes
-from app.models_config import embed_model, llm  # Inicializa configuración global
+from app.routes import upload_routes, query_routes, health_routes
+from app.config import WARMUP_ON_STARTUP
+from app.startup import start_warm_up
 
 
-app = FastAPI(title="RAG Agent for PDF Analysis", description="API RAG Copilot", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Los modelos y Qdrant se cargan en segundo plano: la app acepta conexiones de inmediato
+    # y /ready indica cuándo está lista para atender consultas.
+    if WARMUP_ON_STARTUP:
+        start_warm_up()
+    yield
+
+
+app = FastAPI(title="RAG Agent for PDF Analysis", description="API RAG Copilot", version="1.0.0", lifespan=lifespan)
 
 origins = os.getenv("ALLOWED_ORIGINS", "").split(",")
 
@@ -17,6 +28,7 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.include_router(health_routes.router)
 app.include_router(upload_routes.router)
 app.include_router(query_routes.router)
 
@@ -0,0 +1,103 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from .config import UPLOAD_DIR
+
+MANIFEST_FILE = "manifest.json"  # dentro de la carpeta de persistencia de cada tenant
+
+
+def write_json_atomic(path, data):
+    """Escritura atómica: archivo temporal en el mismo directorio + os.replace."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class DocumentManifest:
+    """
+    Registro persistente de documentos ingestados: hash SHA256 -> filename (nombre con el que
+    se subió), stored_name (nombre del PDF en la carpeta de uploads), tamaño, páginas,
+    ids de nodos y fecha de ingesta.
+    Se carga una sola vez al iniciar y se reescribe de forma atómica en cada cambio,
+    de modo que detectar duplicados es una búsqueda en un diccionario.
+    """
+
+    def __init__(self, path, upload_dir=UPLOAD_DIR):
+        self.path = path
+        self.upload_dir = upload_dir
+        self._lock = threading.RLock()
+        self._entries = {}
+        self.load()
+
+    def load(self):
+        with self._lock:
+            if os.path.exists(self.path):
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self._entries = json.load(f)
+            else:
+                self._entries = self._bootstrap_from_uploads()
+                if self._entries:
+                    self._save()
+
+    def _bootstrap_from_uploads(self):
+        """Migración única: construye el manifiesto a partir de los PDFs ya subidos."""
+        entries = {}
+        for filename in sorted(os.listdir(self.upload_dir)):
+            if not filename.lower().endswith(".pdf"):
+                continue
+            path = os.path.join(self.upload_dir, filename)
+            hash_sha256 = hashlib.sha256()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    hash_sha256.update(chunk)
+            entries[hash_sha256.hexdigest()] = {
+                "filename": filename,
+                "stored_name": filename,
+                "size": os.path.getsize(path),
+                "page_count": None,
+                "node_ids": [],
+                "ingested_at": None,
+            }
+        return entries
+
+    def _save(self):
+        write_json_atomic(self.path, self._entries)
+
+    def __contains__(self, file_hash):
+        return file_hash in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, file_hash):
+        entry = self._entries.get(file_hash)
+        return dict(entry) if entry else None
+
+    def entries(self):
+        """Copia de las entradas como lista de dicts con su hash incluido."""
+        with self._lock:
+            return [{"file_hash": h, **entry} for h, entry in self._entries.items()]
+
+    def add(self, file_hash, entry):
+        with self._lock:
+            self._entries[file_hash] = entry
+            self._save()
+
+    def remove(self, file_hash):
+        with self._lock:
+            if self._entries.pop(file_hash, None) is not None:
+                self._save()
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+            self._save()
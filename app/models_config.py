@@ -1,35 +1,153 @@
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
-from llama_index.llms.groq import Groq
-from llama_index.llms.openai import OpenAI
-from llama_index.core import Settings
+import os
+import threading
 from .config import GROQ_API_KEY, DEVICE, EMBEDDING_MODEL,LLM_PROVIDER,EMBEDDING_PROVIDER, OPENAI_API_KEY,LLM_MODEL
+from .config import EMBEDDING_DIM, EMBEDDING_THREADS, EMBEDDING_QUANTIZE, RERANK_MODEL
+from .config import CACHE_DIR, EMBED_CACHE_ENABLED, EMBED_CACHE_MAX_ENTRIES, EMBED_CACHE_PERSIST, EMBED_MICROBATCH_WAIT_MS
 
-if LLM_PROVIDER == "groq":
-    if not GROQ_API_KEY:
-        raise ValueError("Falta GROQ_API_KEY en el .env")
-    llm = Groq(model=LLM_MODEL, temperature=0, api_key=GROQ_API_KEY)
+# Los modelos se cargan de forma perezosa (torch, pesos, clientes) para que la app
+# acepte conexiones de inmediato; `init_models` los crea una sola vez y los registra en Settings.
+_models = {}
+_models_lock = threading.Lock()
 
-elif LLM_PROVIDER == "openai":
-    if not OPENAI_API_KEY:
-        raise ValueError("Falta OPENAI_API_KEY en el .env")
-    llm = OpenAI(model=LLM_MODEL, temperature=0, api_key=OPENAI_API_KEY)
+def build_llm():
+    if LLM_PROVIDER == "groq":
+        from llama_index.llms.groq import Groq
+        if not GROQ_API_KEY:
+            raise ValueError("Falta GROQ_API_KEY en el .env")
+        return Groq(model=LLM_MODEL, temperature=0, api_key=GROQ_API_KEY)
 
-else:
-    raise ValueError(f"Proveedor LLM no soportado: {LLM_PROVIDER}")
+    elif LLM_PROVIDER == "openai":
+        from llama_index.llms.openai import OpenAI
+        if not OPENAI_API_KEY:
+            raise ValueError("Falta OPENAI_API_KEY en el .env")
+        return OpenAI(model=LLM_MODEL, temperature=0, api_key=OPENAI_API_KEY)
+
+    else:
+        raise ValueError(f"Proveedor LLM no soportado: {LLM_PROVIDER}")
 
 # Configurar modelo de embeddings
-if EMBEDDING_PROVIDER == "huggingface":
-    embed_model = HuggingFaceEmbedding(model_name=EMBEDDING_MODEL, device=DEVICE)
+def build_embed_model(provider=EMBEDDING_PROVIDER, model_name=EMBEDDING_MODEL):
+    """Crea el modelo de embeddings del proveedor indicado (sin cache)."""
+    if provider == "huggingface":
+        from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+        return HuggingFaceEmbedding(model_name=model_name, device=DEVICE)
+
+    elif provider == "openai":
+        from llama_index.embeddings.openai import OpenAIEmbedding
+        if not OPENAI_API_KEY:
+            raise ValueError("Falta OPENAI_API_KEY en el .env")
+        return OpenAIEmbedding(model=model_name, api_key=OPENAI_API_KEY)
+
+    elif provider == "fastembed":
+        # ONNX Runtime optimizado para CPU a través de fastembed
+        from llama_index.embeddings.fastembed import FastEmbedEmbedding
+        return FastEmbedEmbedding(
+            model_name=model_name,
+            threads=EMBEDDING_THREADS or None,
+            cache_dir=os.path.join(CACHE_DIR, "fastembed")
+        )
+
+    elif provider == "onnx":
+        # ONNX Runtime directo, con cuantización int8 opcional
+        from .onnx_embedding import OnnxEmbedding
+        return OnnxEmbedding(
+            model_name=model_name,
+            cache_dir=os.path.join(CACHE_DIR, "onnx"),
+            quantize=EMBEDDING_QUANTIZE,
+            threads=EMBEDDING_THREADS
+        )
+
+    else:
+        raise ValueError(f"Proveedor de embeddings no soportado: {provider}")
+
+def _load_embed_model():
+    embed_model = build_embed_model()
+
+    # La colección se crea con EMBEDDING_DIM: un modelo con otra dimensión no sirve para ella
+    embedding_dim = len(embed_model.get_text_embedding("dimension check"))
+    if embedding_dim != EMBEDDING_DIM:
+        raise ValueError(
+            f"El modelo '{EMBEDDING_MODEL}' ({EMBEDDING_PROVIDER}) genera vectores de {embedding_dim} "
+            f"dimensiones pero EMBEDDING_DIM={EMBEDDING_DIM}"
+        )
+
+    _models["embedding_signature"] = {
+        "provider": EMBEDDING_PROVIDER,
+        "model": EMBEDDING_MODEL,
+        "pooling": _pooling_mode(embed_model),
+    }
+
+    # Cache de embeddings (LRU + disco opcional) y micro-lotes alrededor del modelo
+    if EMBED_CACHE_ENABLED:
+        from .embedding_cache import CachedEmbedding
+        embed_model = CachedEmbedding(
+            embed_model,
+            max_entries=EMBED_CACHE_MAX_ENTRIES,
+            store_path=os.path.join(CACHE_DIR, "embeddings.sqlite") if EMBED_CACHE_PERSIST else None,
+            microbatch_wait_ms=EMBED_MICROBATCH_WAIT_MS,
+            backend=f"{EMBEDDING_PROVIDER}-int8" if EMBEDDING_PROVIDER == "onnx" and EMBEDDING_QUANTIZE else EMBEDDING_PROVIDER
+        )
+    return embed_model
+
+def _pooling_mode(embed_model):
+    """Pooling del modelo local (ONNX o sentence-transformers); None si el proveedor no lo expone."""
+    if getattr(embed_model, "pooling", None):
+        return embed_model.pooling
+    for module in getattr(embed_model, "_model", None) or []:
+        if hasattr(module, "get_pooling_mode_str"):
+            return module.get_pooling_mode_str()
+    return None
+
+def embedding_signature():
+    """Proveedor, modelo y pooling de los embeddings: se registran por colección al ingestar."""
+    init_models()
+    return _models["embedding_signature"]
+
+def models_ready():
+    return "embed_model" in _models and "llm" in _models
+
+def init_models():
+    """Carga el LLM y el modelo de embeddings una sola vez (thread-safe) y configura LlamaIndex."""
+    if models_ready():
+        return
+    with _models_lock:
+        if models_ready():
+            return
+        from llama_index.core import Settings
+        llm = build_llm()
+        embed_model = _load_embed_model()
+
+        # Configuración global de LlamaIndex
+        Settings.embed_model = embed_model
+        Settings.llm = llm
+        _models["llm"] = llm
+        _models["embed_model"] = embed_model
+
+def build_reranker(model_name=RERANK_MODEL):
+    """Cross-encoder de sentence-transformers para re-puntuar pares (pregunta, chunk) en CPU/GPU."""
+    from sentence_transformers import CrossEncoder
+    return CrossEncoder(model_name, device=DEVICE, max_length=512)
+
+def get_reranker():
+    """El cross-encoder se carga recién en la primera consulta con rerank (o en el warm-up si RERANK_ENABLED)."""
+    if "reranker" not in _models:
+        with _models_lock:
+            if "reranker" not in _models:
+                _models["reranker"] = build_reranker()
+    return _models["reranker"]
 
-elif EMBEDDING_PROVIDER == "openai":
-    from llama_index.embeddings.openai import OpenAIEmbedding
-    if not OPENAI_API_KEY:
-        raise ValueError("Falta OPENAI_API_KEY en el .env")
-    embed_model = OpenAIEmbedding(model=EMBEDDING_MODEL, api_key=OPENAI_API_KEY)
+def get_llm():
+    init_models()
+    return _models["llm"]
 
-else:
-    raise ValueError(f"Proveedor de embeddings no soportado: {EMBEDDING_PROVIDER}")
+def get_embed_model():
+    init_models()
+    return _models["embed_model"]
 
-# Configuración global de LlamaIndex
-Settings.embed_model = embed_model
-Settings.llm = llm
+def __getattr__(name):
+    # Compatibilidad con `from app.models_config import embed_model, llm`
+    if name == "embed_model":
+        return get_embed_model()
+    if name == "llm":
+        return get_llm()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
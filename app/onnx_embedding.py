@@ -0,0 +1,171 @@
+import json
+import os
+from typing import Any, List, Optional
+
+import numpy as np
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.core.embeddings import BaseEmbedding
+
+# Instrucciones que sentence-transformers antepone a queries y textos según la familia del modelo
+BGE_QUERY_INSTRUCTION = "Represent this question for searching relevant passages: "
+
+# Módulos del pipeline de sentence-transformers (modules.json) que se reproducen sobre la
+# salida del encoder ONNX. Otros (Dense, el Transformer de instructor, ...) cambian el espacio
+# vectorial: esos modelos se rechazan en lugar de generar vectores distintos sin avisar.
+TRANSFORMER_MODULE = "sentence_transformers.models.Transformer"
+POOLING_MODULE = "sentence_transformers.models.Pooling"
+NORMALIZE_MODULE = "sentence_transformers.models.Normalize"
+POOLING_MODES = {"pooling_mode_cls_token": "cls", "pooling_mode_mean_tokens": "mean", "pooling_mode_max_tokens": "max"}
+
+
+def default_instructions(model_name):
+    """Instrucciones (query, texto) que antepone sentence-transformers para cada familia de modelos."""
+    if model_name.startswith("BAAI/bge-") and "-en" in model_name:
+        return BGE_QUERY_INSTRUCTION, ""
+    return "", ""
+
+
+def prepare_onnx_model(model_name, cache_dir, quantize=False, onnx_file="onnx/model.onnx"):
+    """
+    Descarga el modelo ONNX ya exportado del repositorio de HuggingFace (archivo `onnx_file`)
+    y, si se pide, genera una única vez la versión cuantizada a int8 (cuantización dinámica).
+    Devuelve (ruta del .onnx a usar, carpeta del modelo para el tokenizer).
+    """
+    from huggingface_hub import snapshot_download
+
+    model_dir = snapshot_download(
+        repo_id=model_name,
+        cache_dir=cache_dir,
+        allow_patterns=[onnx_file, "*.json", "*.txt", "*.model"],
+    )
+    model_path = os.path.join(model_dir, onnx_file)
+    if not os.path.exists(model_path):
+        raise ValueError(f"El modelo '{model_name}' no publica '{onnx_file}'; usa EMBEDDING_PROVIDER=fastembed o huggingface")
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantized_dir = os.path.join(cache_dir, "quantized", model_name.replace("/", "__"))
+        quantized_path = os.path.join(quantized_dir, "model_int8.onnx")
+        if not os.path.exists(quantized_path):
+            os.makedirs(quantized_dir, exist_ok=True)
+            quantize_dynamic(model_path, quantized_path, weight_type=QuantType.QInt8)
+        model_path = quantized_path
+    return model_path, model_dir
+
+
+def read_pooling_mode(model_dir, model_name):
+    """
+    Pooling del modelo según su modules.json y <Pooling>/config.json de sentence-transformers
+    ("cls", "mean" o "max"). Sin modules.json (no es un modelo de sentence-transformers) se
+    usa mean pooling, como haría sentence-transformers. Rechaza pipelines con otros módulos.
+    """
+    modules_path = os.path.join(model_dir, "modules.json")
+    if not os.path.exists(modules_path):
+        return "mean"
+    with open(modules_path, "r", encoding="utf-8") as f:
+        modules = json.load(f)
+
+    unsupported = [m["type"] for m in modules if m["type"] not in (TRANSFORMER_MODULE, POOLING_MODULE, NORMALIZE_MODULE)]
+    if unsupported:
+        raise ValueError(
+            f"El modelo '{model_name}' usa módulos que el proveedor onnx no reproduce ({', '.join(unsupported)}); "
+            f"usa EMBEDDING_PROVIDER=huggingface"
+        )
+    pooling = [m for m in modules if m["type"] == POOLING_MODULE]
+    if not pooling:
+        return "mean"
+    with open(os.path.join(model_dir, pooling[0]["path"], "config.json"), "r", encoding="utf-8") as f:
+        config = json.load(f)
+    enabled = [key for key, value in config.items() if key.startswith("pooling_mode_") and value]
+    if len(enabled) != 1 or enabled[0] not in POOLING_MODES:
+        raise ValueError(f"Pooling no soportado por el proveedor onnx en '{model_name}': {', '.join(enabled) or 'ninguno'}")
+    return POOLING_MODES[enabled[0]]
+
+
+class OnnxEmbedding(BaseEmbedding):
+    """
+    Embeddings en CPU con ONNX Runtime: el pooling que declara el modelo (CLS, mean o max,
+    ver read_pooling_mode) y normalización L2 sobre la salida del encoder.
+    """
+
+    max_length: int = Field(default=512, description="Máximo de tokens por texto.")
+    quantize: bool = Field(default=False, description="Usar la versión cuantizada a int8.")
+    query_instruction: Optional[str] = Field(default=None)
+    text_instruction: Optional[str] = Field(default=None)
+    pooling: str = Field(default="mean", description="cls, mean o max (según la config del modelo).")
+
+    _session: Any = PrivateAttr()
+    _tokenizer: Any = PrivateAttr()
+    _input_names: set = PrivateAttr()
+
+    def __init__(
+        self,
+        model_name: str,
+        cache_dir: str,
+        quantize: bool = False,
+        threads: int = 0,
+        max_length: int = 512,
+        embed_batch_size: int = 32,
+        **kwargs: Any,
+    ):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        query_instruction, text_instruction = default_instructions(model_name)
+        super().__init__(
+            model_name=model_name,
+            max_length=max_length,
+            quantize=quantize,
+            query_instruction=query_instruction,
+            text_instruction=text_instruction,
+            embed_batch_size=embed_batch_size,
+            **kwargs,
+        )
+        model_path, model_dir = prepare_onnx_model(model_name, cache_dir, quantize=quantize)
+        self.pooling = read_pooling_mode(model_dir, model_name)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self._session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self._input_names = {i.name for i in self._session.get_inputs()}
+        self._tokenizer = AutoTokenizer.from_pretrained(model_dir)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "OnnxEmbedding"
+
+    def _embed(self, inputs: List[str], prompt_name: Optional[str] = None) -> List[List[float]]:
+        prefix = self.query_instruction if prompt_name == "query" else self.text_instruction
+        if prefix:
+            inputs = [prefix + text for text in inputs]
+        encoded = self._tokenizer(
+            inputs, padding=True, truncation=True, max_length=self.max_length, return_tensors="np"
+        )
+        feed = {name: value.astype(np.int64) for name, value in encoded.items() if name in self._input_names}
+        if "token_type_ids" in self._input_names and "token_type_ids" not in feed:
+            feed["token_type_ids"] = np.zeros_like(encoded["input_ids"], dtype=np.int64)
+        hidden = self._session.run(None, feed)[0]
+        mask = encoded["attention_mask"][..., None].astype(np.float32)
+        if self.pooling == "cls":
+            pooled = hidden[:, 0]
+        elif self.pooling == "max":
+            pooled = np.where(mask > 0, hidden, -1e9).max(axis=1)
+        else:
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.tolist()
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._embed([query], prompt_name="query")[0]
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._get_query_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._embed([text], prompt_name="text")[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts, prompt_name="text")
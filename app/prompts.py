@@ -30,6 +30,21 @@ Instrucciones:
 Pregunta: Proporciona un resumen completo y estructurado de este documento.
 """)
 
+# Paso "map" del resumen jerárquico: cada sección se condensa antes de combinarlas
+SUMMARIZE_SECTION_PROMPT = PromptTemplate("""
+Eres un experto en análisis de documentos. El siguiente texto es una sección de un documento más largo.
+
+Sección:
+{context_str}
+
+Instrucciones:
+1. Resume la sección en no más de 150 palabras
+2. Conserva nombres, fechas, cifras y conclusiones que aparezcan
+3. No agregues información que no esté en la sección
+
+Resumen de la sección:
+""")
+
 RELATION_PROMPT = PromptTemplate("""
 Eres un experto analista de documentos. Tu tarea es identificar y analizar las relaciones, conexiones y patrones entre los siguientes documentos basándote en sus resúmenes.
 
@@ -69,4 +84,20 @@ FORMATO DE RESPUESTA:
 - Proporciona una conclusión sobre cómo estos documentos se relacionan como conjunto
 
 RESPUESTA DETALLADA:
-""")
\ No newline at end of file
+""")
+
+# Reducción jerárquica del análisis de relaciones: combina análisis de grupos de documentos
+RELATION_MERGE_PROMPT = PromptTemplate("""
+Eres un experto analista de documentos. Los siguientes son análisis de relaciones hechos
+sobre distintos grupos de documentos de un mismo corpus.
+
+ANÁLISIS PARCIALES:
+{context_str}
+
+Combínalos en un único análisis de las relaciones temáticas, temporales, de contenido y
+funcionales entre todos los documentos, con sus patrones e insights. Conserva los nombres
+de los documentos y los ejemplos concretos, elimina repeticiones y no inventes información
+que no esté en los análisis.
+
+RESPUESTA DETALLADA:
+""")
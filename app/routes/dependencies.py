@@ -0,0 +1,22 @@
+from fastapi import Header
+from fastapi.concurrency import run_in_threadpool
+from ..config import DEFAULT_TENANT
+from ..models_config import init_models, models_ready
+
+
+async def require_models():
+    """Dependencia de las rutas que usan el LLM o embeddings: si los modelos aún no
+    están cargados (warm-up en curso o desactivado) los carga en el threadpool."""
+    if not models_ready():
+        await run_in_threadpool(init_models)
+
+
+async def current_tenant(x_tenant_id: str = Header(DEFAULT_TENANT)):
+    """Tenant del request según el header X-Tenant-ID (sin header, el tenant por defecto).
+    Queda reservado en el registro de tenants mientras dura el request, así no se desaloja."""
+    from ..tenants import tenant_registry
+    tenant = await run_in_threadpool(tenant_registry.acquire, x_tenant_id)
+    try:
+        yield tenant
+    finally:
+        tenant_registry.release(tenant)
@@ -0,0 +1,25 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse
+from ..config import METRICS_ENABLED
+from ..startup import readiness
+from ..telemetry import render_metrics
+
+router = APIRouter()
+
+@router.get("/health")
+async def health():
+    '''Liveness: el proceso está vivo y atendiendo requests (no depende de modelos ni de Qdrant).'''
+    return {"status": "ok"}
+
+@router.get("/ready")
+async def ready():
+    '''Readiness: 200 cuando los modelos están cargados y Qdrant inicializado, 503 mientras tanto.'''
+    state = readiness()
+    return JSONResponse(status_code=200 if state["ready"] else 503, content=state)
+
+@router.get("/metrics")
+async def metrics():
+    '''Histogramas de duración, tokens y chunks por operación y etapa, en formato Prometheus.'''
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Métricas deshabilitadas (METRICS_ENABLED=False).")
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
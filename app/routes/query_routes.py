@@ -1,27 +1,112 @@
-from fastapi import APIRouter, Query
-from ..services.query_service import run_query, summarize_docs_alternative, summarize_from_existing_vectorstore, analyze_document_relations
+from fastapi import APIRouter, Query, Depends
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+import json
+from datetime import datetime
+from typing import List, Literal, Optional
+from .dependencies import require_models, current_tenant
+from ..models_config import models_ready, get_embed_model
 
+# Los servicios (LlamaIndex, Qdrant) se importan dentro de cada ruta para no
+# retrasar el arranque de la app; el warm-up los deja importados en segundo plano.
 router = APIRouter()
 
-@router.get("/query")
-async def query_documents(q: str = Query(...)):
-    '''Consulta abierta personalizada por el usuario para analizar documentos en el índice.'''
-    response = run_query(q)
-    return {"query": q, "response": response}
+def query_filters(
+    file_name: Optional[List[str]] = Query(None),
+    uploaded_after: Optional[datetime] = Query(None),
+    uploaded_before: Optional[datetime] = Query(None),
+    page_from: Optional[int] = Query(None, ge=1),
+    page_to: Optional[int] = Query(None, ge=1),
+):
+    '''Filtros de payload de /query: file_name (repetible), rango de fecha de ingesta y rango de páginas.'''
+    return {
+        "file_names": file_name,
+        "uploaded_from": uploaded_after.timestamp() if uploaded_after else None,
+        "uploaded_to": uploaded_before.timestamp() if uploaded_before else None,
+        "page_from": page_from,
+        "page_to": page_to,
+    }
 
-@router.get("/summarize-docs")
-async def summarize_documents():
+@router.get("/query", dependencies=[Depends(require_models)])
+async def query_documents(
+    q: str = Query(...),
+    mode: Literal["dense", "hybrid"] = Query("dense"),
+    rerank: Optional[bool] = Query(None),
+    filters: dict = Depends(query_filters),
+    tenant = Depends(current_tenant)
+):
+    '''Consulta abierta personalizada por el usuario para analizar documentos en el índice.
+    mode=hybrid combina la búsqueda vectorial con BM25 (útil para códigos, números y nombres exactos).
+    rerank=true re-puntúa más candidatos con un cross-encoder y limita el contexto a CONTEXT_TOKEN_BUDGET
+    tokens (por defecto, RERANK_ENABLED).
+    Los filtros (file_name, uploaded_after, uploaded_before, page_from, page_to) se aplican en Qdrant.
+    La consulta (embedding, búsqueda y LLM) corre en el threadpool para no bloquear el event loop.'''
+    from ..services.query_service import run_query
+    response = await run_in_threadpool(run_query, tenant, q, mode, filters, rerank)
+    return {"query": q, "mode": mode, "response": response}
+
+@router.get("/query/stream", dependencies=[Depends(require_models)])
+async def query_documents_stream(
+    q: str = Query(...),
+    mode: Literal["dense", "hybrid"] = Query("dense"),
+    rerank: Optional[bool] = Query(None),
+    filters: dict = Depends(query_filters),
+    tenant = Depends(current_tenant)
+):
+    '''Igual que /query pero en streaming (NDJSON, un evento JSON por línea):
+    primero las fuentes recuperadas y luego los tokens del LLM a medida que llegan.'''
+    from ..services.query_service import stream_query
+    events = await run_in_threadpool(stream_query, tenant, q, mode, filters, rerank)
+
+    def ndjson():
+        for event in events:
+            yield json.dumps(event, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+@router.get("/cache-stats")
+async def cache_stats(tenant = Depends(current_tenant)):
+    '''Contadores del cache de respuestas de /query del tenant (hits, misses, desalojos, invalidaciones),
+    del cache de embeddings (compartido), del planificador de llamadas al LLM y del registro de tenants.'''
+    from ..services.llm_scheduler import llm_scheduler
+    from ..tenants import tenant_registry
+    embed_model = get_embed_model() if models_ready() else None
+    return {
+        "tenant": tenant.id,
+        "tenants": tenant_registry.stats(),
+        "answers": tenant.answer_cache.stats(),
+        "embeddings": embed_model.stats() if hasattr(embed_model, "stats") else None,
+        "llm": llm_scheduler.stats()
+    }
+
+@router.get("/document-graph")
+async def document_graph(threshold: float = Query(None, ge=-1, le=1), tenant = Depends(current_tenant)):
+    '''Grafo de similitud entre documentos: centroides de los embeddings de cada archivo,
+    aristas entre pares con similitud coseno >= threshold y clusters (componentes conexas,
+    divididas si superan RELATION_CLUSTER_MAX_SIZE documentos).'''
+    from ..config import RELATION_SIMILARITY_THRESHOLD
+    from ..services.similarity_graph import build_similarity_graph
+    return await run_in_threadpool(
+        build_similarity_graph,
+        tenant,
+        RELATION_SIMILARITY_THRESHOLD if threshold is None else threshold
+    )
+
+@router.get("/summarize-docs", dependencies=[Depends(require_models)])
+async def summarize_documents(tenant = Depends(current_tenant)):
     '''Resume todos los documentos en el índice.
     Lee la carpeta de documentos y hace un resumen de su contenido.
     Con los resúmenes generados, se analizan las relaciones entre documentos.'''
-    response = summarize_docs_alternative()
-    relation = analyze_document_relations(response)
+    from ..services.query_service import summarize_docs_alternative, analyze_document_relations
+    response = await run_in_threadpool(summarize_docs_alternative, tenant)
+    relation = await run_in_threadpool(analyze_document_relations, tenant, response)
     return {"summary": response, "relations": relation}
 
-@router.get("/summarize-docs_byvector")
-async def summarize_documents():
-    '''Resume los documentos que encuentra en los vectores no garantiza encontrar todos.
+@router.get("/summarize-docs_byvector", dependencies=[Depends(require_models)])
+async def summarize_documents(tenant = Depends(current_tenant)):
+    '''Resume los documentos guardados en el vector store (recorre toda la colección con scroll).
     hace un resumen de su contenido y busca relaciones entre documentos.'''
-    response = summarize_from_existing_vectorstore()
-    relation = analyze_document_relations(response)
+    from ..services.query_service import summarize_from_existing_vectorstore, analyze_document_relations
+    response = await run_in_threadpool(summarize_from_existing_vectorstore, tenant)
+    relation = await run_in_threadpool(analyze_document_relations, tenant, response)
     return {"summary": response, "relations": relation}
\ No newline at end of file
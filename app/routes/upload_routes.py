@@ -1,59 +1,105 @@
-from fastapi import APIRouter, File, UploadFile, HTTPException
+from fastapi import APIRouter, File, UploadFile, HTTPException, Query, Depends
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
-import os
 from typing import List
-from ..vector_store import get_qdrant_collection
-from ..services.pdf_service import process_pdf, reset_index
-from .. config import UPLOAD_DIR, PERSIST_DIR, USE_QDRANT, COLLECTION_NAME
+from .dependencies import require_models, current_tenant
+from .. config import USE_QDRANT, QDRANT_LOCAL_PATH
 
+# Los servicios (LlamaIndex, Qdrant) se importan dentro de cada ruta para no
+# retrasar el arranque de la app; el warm-up los deja importados en segundo plano.
 router = APIRouter()
 
-@router.post("/upload-pdf/")
-async def upload_pdfs(files: List[UploadFile] = File(...)):
-    '''Carga y vectoriza varios documentos PDF.'''
-    resultados = []
-    for file in files:
+@router.post("/upload-pdf/", dependencies=[Depends(require_models)])
+async def upload_pdfs(
+    files: List[UploadFile] = File(...),
+    background: bool = Query(False),
+    tenant = Depends(current_tenant)
+):
+    '''Carga y vectoriza varios documentos PDF en la colección del tenant (header X-Tenant-ID).
+    Los PDFs se parsean en paralelo y sus chunks se embeben e insertan en Qdrant por lotes.
+    Con background=true responde de inmediato con un job_id; el progreso se consulta en /ingest-jobs/{job_id}.'''
+    from ..services.pdf_service import save_upload, process_files
+    from ..services.ingest_jobs import submit_job
+    resultados = [None] * len(files)
+    items, positions = [], []
+    for position, file in enumerate(files):
         try:
-            process_pdf(file)
-            resultados.append(f"Documento '{file.filename}' cargado y vectorizado")
+            items.append(await run_in_threadpool(save_upload, tenant, file))
+            positions.append(position)
         except Exception as e:
-            resultados.append({"filename": file.filename, "status": "error", "detail": str(e)})
+            resultados[position] = {"filename": file.filename, "status": "error", "detail": str(e)}
+
+    if background:
+        job_id = submit_job(tenant, items) if items else None
+        for position, item in zip(positions, items):
+            resultados[position] = f"Documento '{item['filename']}' encolado para vectorizar"
+        return JSONResponse(
+            status_code=202,
+            content={
+                "job_id": job_id,
+                "status_url": f"/ingest-jobs/{job_id}" if job_id else None,
+                "results": resultados
+            }
+        )
+
+    if items:
+        ingested = await run_in_threadpool(process_files, tenant, items)
+        for position, item, result in zip(positions, items, ingested):
+            if result["status"] == "success":
+                resultados[position] = f"Documento '{item['filename']}' cargado y vectorizado"
+            else:
+                error = HTTPException(status_code=500, detail=result["detail"])
+                resultados[position] = {"filename": item["filename"], "status": "error", "detail": str(error)}
     
     return JSONResponse(content={"results": resultados})
 
+@router.get("/ingest-jobs/{job_id}")
+async def ingest_job_status(job_id: str, tenant = Depends(current_tenant)):
+    '''Estado de un job de ingesta en segundo plano: progreso por archivo
+    (páginas parseadas, chunks embebidos, puntos escritos) y errores.
+    Solo se ven los jobs del propio tenant.'''
+    from ..services.ingest_jobs import get_job
+    return get_job(tenant, job_id)
+
 @router.get("/list-documents/")
-async def list_documents():
+async def list_documents(tenant = Depends(current_tenant)):
     """
-    Devuelve la lista de archivos PDF cargados y estado del índice vectorial.
+    Devuelve la lista de archivos PDF cargados por el tenant y el estado de su colección.
     """
     try:
-        # 1. Archivos PDF subidos
-        uploaded_files = [
-            f for f in os.listdir(UPLOAD_DIR)
-            if f.endswith(".pdf")
+        # 1. Archivos PDF subidos (según el manifiesto)
+        documents = [
+            {key: value for key, value in entry.items() if key != "node_ids"}
+            for entry in tenant.manifest.entries()
         ]
+        uploaded_files = [doc["filename"] for doc in documents]
 
         # 2. Estado del índice vectorial
-        if USE_QDRANT:
+        from ..vector_store import get_qdrant_collection
 
-            collection_info = get_qdrant_collection()
-            num_vectors = collection_info.vectors_count
+        tenant.vector_store()  # crea la colección del tenant si todavía no existe
+        collection_info = get_qdrant_collection(tenant.collection_name)
+        if USE_QDRANT:
             index_info = {
                 "backend": "qdrant",
-                "collection_name": COLLECTION_NAME,
-                "num_vectors": num_vectors
+                "tenant": tenant.id,
+                "collection_name": tenant.collection_name,
+                "num_vectors": collection_info.vectors_count
             }
         else:
-            # Modo local: contar cuántos archivos están persistidos
-            persisted = os.listdir(PERSIST_DIR) if os.path.exists(PERSIST_DIR) else []
+            # Qdrant embebido (sin servidor): persistido en QDRANT_LOCAL_PATH
             index_info = {
                 "backend": "local",
-                "persisted_files": persisted,
-                "num_items": len(persisted)
+                "path": QDRANT_LOCAL_PATH,
+                "tenant": tenant.id,
+                "collection_name": tenant.collection_name,
+                "num_vectors": collection_info.points_count,
+                "num_documents": len(documents)
             }
 
         return {
             "uploaded_files": uploaded_files,
+            "documents": documents,
             "index_info": index_info
         }
 
@@ -61,7 +107,8 @@ async def list_documents():
         raise HTTPException(status_code=500, detail=f"Error al listar documentos: {str(e)}")
 
 @router.delete("/reset-index")
-def reset_index_endpoint():
-    '''Reinicia el índice vectorial. 
+def reset_index_endpoint(tenant = Depends(current_tenant)):
+    '''Reinicia el índice vectorial del tenant (header X-Tenant-ID); los demás tenants no se tocan.
     Elimina los archivos .json, los archivos .pdf y los documentos en qdrant'''
-    return reset_index()
\ No newline at end of file
+    from ..services.pdf_service import reset_index
+    return reset_index(tenant)
\ No newline at end of file
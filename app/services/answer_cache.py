@@ -0,0 +1,130 @@
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+import numpy as np
+
+from ..config import ANSWER_CACHE_ENABLED
+
+
+def normalize_question(question: str) -> str:
+    """Normaliza la pregunta para usarla como clave: minúsculas, sin tildes,
+    sin signos de puntuación y con espacios colapsados."""
+    text = unicodedata.normalize("NFKD", question.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+class AnswerCache:
+    """
+    Cache de respuestas de run_query (uno por tenant) con expiración (TTL) y desalojo LRU.
+    Además de la clave exacta (pregunta normalizada), puede buscar preguntas casi
+    idénticas por similitud coseno de sus embeddings si `similarity_threshold` > 0.
+    `scope` separa respuestas obtenidas con distintas opciones de recuperación
+    (por ejemplo, modo denso o híbrido). Se invalida completo cuando cambia el corpus.
+
+    `generation` aumenta en cada invalidación: quien calcula una respuesta lee la generación
+    antes de consultar el índice y la pasa a `put`; si mientras tanto terminó una ingesta
+    (o un reset), la respuesta se calculó con el índice viejo y no se guarda.
+    """
+
+    def __init__(self, max_entries, ttl_seconds, similarity_threshold=0.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self._entries = OrderedDict()  # clave -> (respuesta, creado_en, embedding normalizado)
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._counters = {
+            "hits": 0, "semantic_hits": 0, "misses": 0, "evictions": 0, "expirations": 0,
+            "invalidations": 0, "stale_discards": 0
+        }
+
+    @property
+    def generation(self):
+        return self._generation
+
+    @property
+    def semantic_enabled(self):
+        return self.similarity_threshold > 0
+
+    def _expired(self, created_at):
+        return self.ttl_seconds > 0 and time.monotonic() - created_at > self.ttl_seconds
+
+    def get(self, question, embedding=None, scope=""):
+        key = (scope, normalize_question(question))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if self._expired(entry[1]):
+                    self._entries.pop(key)
+                    self._counters["expirations"] += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self._counters["hits"] += 1
+                    return entry[0]
+
+            if embedding is not None and self.semantic_enabled:
+                match = self._most_similar(embedding, scope)
+                if match is not None:
+                    self._entries.move_to_end(match)
+                    self._counters["semantic_hits"] += 1
+                    return self._entries[match][0]
+
+            self._counters["misses"] += 1
+            return None
+
+    def _most_similar(self, embedding, scope):
+        candidates = [
+            (k, e[2]) for k, e in self._entries.items()
+            if k[0] == scope and e[2] is not None and not self._expired(e[1])
+        ]
+        if not candidates:
+            return None
+        matrix = np.stack([vector for _, vector in candidates])
+        scores = matrix @ _unit(embedding)
+        best = int(np.argmax(scores))
+        return candidates[best][0] if scores[best] >= self.similarity_threshold else None
+
+    def put(self, question, answer, embedding=None, scope="", generation=None):
+        key = (scope, normalize_question(question))
+        vector = _unit(embedding) if embedding is not None else None
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                self._counters["stale_discards"] += 1
+                return
+            self._entries[key] = (answer, time.monotonic(), vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+            self._counters["invalidations"] += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["semantic_hits"] + self._counters["misses"]
+            hit_rate = (self._counters["hits"] + self._counters["semantic_hits"]) / lookups if lookups else 0.0
+            return {
+                "enabled": ANSWER_CACHE_ENABLED,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "similarity_threshold": self.similarity_threshold,
+                "generation": self._generation,
+                **self._counters,
+                "hit_rate": round(hit_rate, 4),
+            }
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
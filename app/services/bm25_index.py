@@ -0,0 +1,143 @@
+import math
+import os
+import sqlite3
+import threading
+from collections import Counter
+
+from ..config import BM25_K1, BM25_B
+from .answer_cache import normalize_question
+
+BM25_FILE = "bm25.sqlite"  # dentro de la carpeta de persistencia de cada tenant
+
+
+def tokenize(text):
+    """Términos para BM25: minúsculas, sin tildes ni puntuación. Códigos como
+    'CT-2024-001' quedan como términos separados ('ct', '2024', '001')."""
+    return normalize_question(text).split()
+
+
+class BM25Index:
+    """
+    Índice invertido BM25 sobre los chunks ingestados, en SQLite: se actualiza de forma
+    incremental en cada ingesta (sin recalcular el corpus) y sobrevive reinicios.
+    Los ids de los chunks son los mismos que los de los puntos en Qdrant.
+    """
+
+    def __init__(self, path, k1=BM25_K1, b=BM25_B):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._open()
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS docs (node_id TEXT PRIMARY KEY, file_hash TEXT, length INTEGER);
+            CREATE INDEX IF NOT EXISTS docs_file_hash ON docs (file_hash);
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT, node_id TEXT, tf INTEGER, PRIMARY KEY (term, node_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS postings_node_id ON postings (node_id);
+        """)
+        self._conn.commit()
+        self._doc_count, total_length = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs").fetchone()
+        self._total_length = total_length
+
+    def __len__(self):
+        return self._doc_count
+
+    def _delete_nodes(self, node_ids):
+        for start in range(0, len(node_ids), 500):
+            chunk = node_ids[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            count, length = self._conn.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs WHERE node_id IN ({placeholders})", chunk
+            ).fetchone()
+            self._conn.execute(f"DELETE FROM postings WHERE node_id IN ({placeholders})", chunk)
+            self._conn.execute(f"DELETE FROM docs WHERE node_id IN ({placeholders})", chunk)
+            self._doc_count -= count
+            self._total_length -= length
+
+    def add(self, file_hash, chunks):
+        """Indexa (o reemplaza) chunks de un archivo: lista de (node_id, texto)."""
+        docs, postings = [], []
+        for node_id, text in chunks:
+            terms = Counter(tokenize(text))
+            docs.append((node_id, file_hash, sum(terms.values())))
+            postings.extend((term, node_id, tf) for term, tf in terms.items())
+        with self._lock:
+            self._delete_nodes([node_id for node_id, _, _ in docs])
+            self._conn.executemany("INSERT INTO docs VALUES (?, ?, ?)", docs)
+            self._conn.executemany("INSERT INTO postings VALUES (?, ?, ?)", postings)
+            self._conn.commit()
+            self._doc_count += len(docs)
+            self._total_length += sum(length for _, _, length in docs)
+
+    def remove(self, file_hash):
+        """Elimina todos los chunks de un archivo."""
+        with self._lock:
+            node_ids = [row[0] for row in self._conn.execute("SELECT node_id FROM docs WHERE file_hash = ?", (file_hash,))]
+            self._delete_nodes(node_ids)
+            self._conn.commit()
+
+    def search(self, query, top_k=10):
+        """Los `top_k` chunks con mayor puntaje BM25 para la consulta: lista de (node_id, score).
+        El puntaje se suma y ordena en SQLite: solo vuelven las `top_k` filas, no una por posting."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or self._doc_count == 0:
+            return []
+        placeholders = ",".join("?" * len(terms))
+        with self._lock:
+            doc_count, avg_length = self._doc_count, self._total_length / self._doc_count
+            document_frequency = self._conn.execute(
+                f"SELECT term, COUNT(*) FROM postings WHERE term IN ({placeholders}) GROUP BY term", terms
+            ).fetchall()
+            if not document_frequency:
+                return []
+            idf_cases = " ".join("WHEN ? THEN ?" for _ in document_frequency)
+            idf_params = [
+                value
+                for term, df in document_frequency
+                for value in (term, math.log(1 + (doc_count - df + 0.5) / (df + 0.5)))
+            ]
+            rows = self._conn.execute(
+                f"SELECT p.node_id, SUM((CASE p.term {idf_cases} END) * p.tf * ? "
+                f"/ (p.tf + ? * (1 - ? + ? * d.length / ?))) AS score "
+                f"FROM postings p JOIN docs d ON d.node_id = p.node_id "
+                f"WHERE p.term IN ({placeholders}) GROUP BY p.node_id ORDER BY score DESC LIMIT ?",
+                [*idf_params, self.k1 + 1, self.k1, self.b, self.b, avg_length, *terms, top_k]
+            ).fetchall()
+        return [(node_id, score) for node_id, score in rows]
+
+    def clear(self):
+        """Vacía el índice. Se reabre el archivo porque reset-index puede haber borrado la carpeta."""
+        with self._lock:
+            self._conn.close()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            self._open()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def backfill_bm25_index(tenant):
+    """Indexa en BM25 los chunks que ya están en la colección del tenant si su índice está vacío
+    (colecciones ingestadas antes de existir el índice). Devuelve los chunks indexados."""
+    bm25_index = tenant.bm25_index
+    if len(bm25_index) > 0:
+        return 0
+    from .corpus import iter_documents
+
+    indexed = 0
+    for _, nodes in iter_documents(tenant.collection_name):
+        by_file = {}
+        for node in nodes:
+            by_file.setdefault(node.metadata.get("file_hash", ""), []).append((node.node_id, node.get_content()))
+        for file_hash, chunks in by_file.items():
+            bm25_index.add(file_hash, chunks)
+            indexed += len(chunks)
+    return indexed
@@ -0,0 +1,86 @@
+from qdrant_client.http.models import Filter, FieldCondition, MatchValue, IsEmptyCondition, PayloadField
+from llama_index.core.vector_stores.utils import metadata_dict_to_node
+
+from ..config import CORPUS_SCROLL_PAGE_SIZE
+from ..vector_store import get_qdrant_client
+
+# Campos del payload que identifican el documento de origen de un punto, en orden de preferencia:
+# el hash de contenido (dos PDFs con el mismo nombre son documentos distintos) y, para puntos
+# ingestados antes de guardar file_hash, el id del documento de LlamaIndex.
+SOURCE_FIELDS = ["file_hash", "ref_doc_id"]
+# Nombre con el que se subió el archivo: solo para mostrar, no identifica al documento
+DISPLAY_FIELD = "file_name"
+
+
+def scroll_points(collection_name, scroll_filter=None, with_payload=True, with_vectors=False,
+                  page_size=CORPUS_SCROLL_PAGE_SIZE):
+    """Recorre todos los puntos de la colección (o los que cumplen el filtro) con el scroll
+    paginado de Qdrant, sin embeddings de consulta. Solo una página está en memoria a la vez."""
+    qdrant_client = get_qdrant_client()
+    offset = None
+    while True:
+        points, offset = qdrant_client.scroll(
+            collection_name=collection_name,
+            scroll_filter=scroll_filter,
+            limit=page_size,
+            offset=offset,
+            with_payload=with_payload,
+            with_vectors=with_vectors
+        )
+        yield from points
+        if offset is None:
+            return
+
+
+def scroll_payloads(collection_name, scroll_filter=None, with_payload=True, page_size=CORPUS_SCROLL_PAGE_SIZE):
+    """Como `scroll_points`, pero genera solo el payload de cada punto."""
+    for point in scroll_points(collection_name, scroll_filter, with_payload=with_payload, page_size=page_size):
+        yield point.payload or {}
+
+
+def source_key(payload):
+    """(campo, valor) que identifica el documento de origen de un punto, o None."""
+    for field in SOURCE_FIELDS:
+        if payload.get(field):
+            return field, payload[field]
+    return None
+
+
+def source_name(metadata, default=None):
+    """Nombre para mostrar del documento de origen (el file_name con el que se subió)."""
+    return metadata.get(DISPLAY_FIELD) or default
+
+
+def _source_filter(field, value):
+    must = [FieldCondition(key=field, match=MatchValue(value=value))]
+    # Un punto se agrupa por el primer campo presente: al agrupar por ref_doc_id se excluyen los que tienen file_hash
+    for previous in SOURCE_FIELDS[:SOURCE_FIELDS.index(field)]:
+        must.append(IsEmptyCondition(is_empty=PayloadField(key=previous)))
+    return Filter(must=must)
+
+
+def list_sources(collection_name, page_size=CORPUS_SCROLL_PAGE_SIZE):
+    """Documentos de origen presentes en la colección como (campo, valor), en orden de aparición.
+    Solo se leen los campos de identificación del payload."""
+    sources = {}
+    for payload in scroll_payloads(collection_name, with_payload=SOURCE_FIELDS, page_size=page_size):
+        key = source_key(payload)
+        if key is not None:
+            sources.setdefault(key, None)
+    return list(sources)
+
+
+def iter_documents(collection_name, page_size=CORPUS_SCROLL_PAGE_SIZE):
+    """
+    Enumera todo el corpus indexado agrupado por documento: genera (origen, nodos) con los
+    nodos de cada archivo ordenados por posición. `origen` es el file_hash (o el ref_doc_id
+    de puntos antiguos); el nombre para mostrar sale de los nodos (ver source_name). Primero se listan los orígenes y luego
+    se recorre cada uno con un scroll filtrado, así en memoria solo está un documento a la vez.
+    """
+    for field, value in list_sources(collection_name, page_size=page_size):
+        nodes = [
+            metadata_dict_to_node(payload)
+            for payload in scroll_payloads(collection_name, _source_filter(field, value), page_size=page_size)
+        ]
+        nodes.sort(key=lambda node: (node.metadata.get("chunk_index", 0), node.start_char_idx or 0))
+        yield value, nodes
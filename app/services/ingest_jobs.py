@@ -0,0 +1,128 @@
+import logging
+import queue
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from fastapi import HTTPException
+
+from ..config import INGEST_JOB_WORKERS, INGEST_QUEUE_SIZE, INGEST_JOBS_RETAINED
+from ..tenants import tenant_registry
+from .pdf_service import process_files, discard_upload
+
+# Cola acotada: si está llena, nuevos uploads en segundo plano se rechazan (backpressure)
+_job_queue = queue.Queue(maxsize=INGEST_QUEUE_SIZE)
+_jobs = OrderedDict()
+_jobs_lock = threading.Lock()
+_workers = []
+_workers_lock = threading.Lock()
+
+def _new_file_progress(item):
+    return {
+        "filename": item["filename"],
+        "status": "queued",
+        "pages_parsed": 0,
+        "chunks_total": 0,
+        "chunks_embedded": 0,
+        "points_written": 0,
+        "error": None,
+    }
+
+def _ensure_workers():
+    """Arranca (una sola vez) el pool acotado de workers de ingesta."""
+    with _workers_lock:
+        if _workers:
+            return
+        for i in range(INGEST_JOB_WORKERS):
+            worker = threading.Thread(target=_worker_loop, name=f"ingest-worker-{i}", daemon=True)
+            worker.start()
+            _workers.append(worker)
+
+def _worker_loop():
+    while True:
+        job_id, tenant, items = _job_queue.get()
+        try:
+            _run_job(job_id, tenant, items)
+        except Exception as e:
+            logging.error(f"Error en el job de ingesta {job_id}: {str(e)}")
+        finally:
+            # El job tenía el tenant reservado desde submit_job: recién ahora se puede desalojar
+            tenant_registry.release(tenant)
+            _job_queue.task_done()
+
+def _run_job(job_id, tenant, items):
+    job = _jobs[job_id]
+    files = {item["file_hash"]: job["files"][i] for i, item in enumerate(items)}
+
+    def progress(file_hash, **counts):
+        with _jobs_lock:
+            for counter, value in counts.items():
+                files[file_hash][counter] += value
+
+    with _jobs_lock:
+        job["status"] = "running"
+        job["started_at"] = datetime.now().isoformat()
+        for file_progress in files.values():
+            file_progress["status"] = "running"
+
+    try:
+        results = process_files(tenant, items, progress=progress)
+    except Exception as e:
+        results = [{"status": "error", "detail": str(e)} for _ in items]
+
+    with _jobs_lock:
+        for item, result in zip(items, results):
+            file_progress = files[item["file_hash"]]
+            file_progress["status"] = result["status"]
+            file_progress["error"] = result.get("detail")
+        failed = sum(1 for result in results if result["status"] == "error")
+        job["status"] = "failed" if failed == len(results) else "completed"
+        job["failed_files"] = failed
+        job["finished_at"] = datetime.now().isoformat()
+
+def submit_job(tenant, items):
+    """
+    Encola la ingesta de uploads ya guardados del tenant y devuelve el id del job.
+    Si la cola está llena se descartan los uploads y se responde 429.
+    """
+    _ensure_workers()
+    job_id = uuid.uuid4().hex
+    job = {
+        "job_id": job_id,
+        "tenant": tenant.id,
+        "status": "queued",
+        "created_at": datetime.now().isoformat(),
+        "started_at": None,
+        "finished_at": None,
+        "failed_files": 0,
+        "files": [_new_file_progress(item) for item in items],
+    }
+    with _jobs_lock:
+        _jobs[job_id] = job
+        # Conservar solo los últimos INGEST_JOBS_RETAINED jobs terminados
+        finished = [jid for jid, j in _jobs.items() if j["status"] in ("completed", "failed")]
+        for finished_id in finished[:max(0, len(_jobs) - INGEST_JOBS_RETAINED)]:
+            _jobs.pop(finished_id)
+
+    # El tenant queda reservado (no se desaloja del registro) hasta que termine el job
+    tenant = tenant_registry.acquire(tenant.id)
+    try:
+        _job_queue.put_nowait((job_id, tenant, items))
+    except queue.Full:
+        tenant_registry.release(tenant)
+        with _jobs_lock:
+            _jobs.pop(job_id, None)
+        for item in items:
+            discard_upload(tenant, item)
+        raise HTTPException(
+            status_code=429,
+            detail="La cola de ingesta está llena, intenta nuevamente en unos segundos."
+        )
+    return job_id
+
+def get_job(tenant, job_id):
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is None or job["tenant"] != tenant.id:
+            raise HTTPException(status_code=404, detail=f"No existe el job '{job_id}'")
+        return {**job, "files": [dict(f) for f in job["files"]]}
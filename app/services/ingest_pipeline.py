@@ -0,0 +1,234 @@
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+from multiprocessing import get_context
+from llama_index.core import Settings
+from llama_index.core.schema import MetadataMode
+from qdrant_client.http.models import PointIdsList
+
+from ..config import INGEST_PARSE_WORKERS, EMBED_BATCH_SIZE, PARSE_PAGES_PER_TASK
+from ..telemetry import span, observe
+from .pdf_parser import parse_pdf_pages_timed, pdf_page_count
+
+_STOP = object()
+
+_parse_pool = None
+_parse_pool_lock = threading.Lock()
+
+def _get_parse_pool():
+    """Pool de procesos compartido para parsear PDFs (se crea una sola vez por proceso)."""
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            _parse_pool = ProcessPoolExecutor(
+                max_workers=INGEST_PARSE_WORKERS,
+                mp_context=get_context("spawn")
+            )
+        return _parse_pool
+
+def ingest_files(tenant, items, progress=None):
+    """
+    Pipeline por etapas para ingestar varios PDFs ya guardados en disco en la colección,
+    el índice BM25 y el manifiesto del tenant:
+    1. Un pool de procesos parsea y divide los PDFs en paralelo, por tramos de páginas.
+    2. Una etapa de embeddings agrupa chunks de distintos archivos en lotes de EMBED_BATCH_SIZE.
+    3. Una etapa de escritura inserta cada lote en Qdrant en bloque (y sus términos en el índice BM25).
+
+    `items` es una lista de dicts con filename, file_path y file_hash.
+    Devuelve un dict por archivo ({"status": "success"} o {"status": "error", "detail": ...})
+    en el mismo orden de entrada.
+
+    Todos los chunks del lote llevan `uploaded_at` (epoch de la ingesta) para poder filtrar por fecha.
+
+    `progress`, si se indica, se llama como progress(file_hash, **contadores) con los
+    incrementos de pages_parsed, chunks_total, chunks_embedded y points_written.
+    """
+    state = {
+        item["file_hash"]: {"node_ids": [], "written_ids": [], "page_count": 0, "error": None}
+        for item in items
+    }
+    lock = threading.Lock()
+    embed_queue = queue.Queue(maxsize=4)
+    write_queue = queue.Queue(maxsize=2)
+    vector_store = tenant.vector_store()
+    bm25_index = tenant.bm25_index
+    uploaded_at = time.time()
+
+    def report(nodes, counter):
+        if progress is None:
+            return
+        counts = {}
+        for node in nodes:
+            file_hash = node.metadata["file_hash"]
+            counts[file_hash] = counts.get(file_hash, 0) + 1
+        for file_hash, count in counts.items():
+            progress(file_hash, **{counter: count})
+
+    def fail(file_hashes, error):
+        with lock:
+            for file_hash in file_hashes:
+                if state[file_hash]["error"] is None:
+                    state[file_hash]["error"] = str(error)
+
+    def embed_stage():
+        buffer = []
+
+        def flush(batch):
+            try:
+                with span("ingest", "embed", chunks=len(batch)):
+                    texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in batch]
+                    embeddings = Settings.embed_model.get_text_embedding_batch(texts)
+                for node, embedding in zip(batch, embeddings):
+                    node.embedding = embedding
+                report(batch, "chunks_embedded")
+                write_queue.put(batch)
+            except Exception as e:
+                logging.error(f"Error generando embeddings: {str(e)}")
+                fail({node.metadata["file_hash"] for node in batch}, e)
+
+        while True:
+            nodes = embed_queue.get()
+            if nodes is _STOP:
+                break
+            buffer.extend(nodes)
+            while len(buffer) >= EMBED_BATCH_SIZE:
+                flush(buffer[:EMBED_BATCH_SIZE])
+                del buffer[:EMBED_BATCH_SIZE]
+        if buffer:
+            flush(buffer)
+        write_queue.put(_STOP)
+
+    def write_stage():
+        while True:
+            batch = write_queue.get()
+            if batch is _STOP:
+                break
+            try:
+                with span("ingest", "write", chunks=len(batch)):
+                    vector_store.add(batch)
+                with span("ingest", "bm25", chunks=len(batch)):
+                    by_file = {}
+                    for node in batch:
+                        by_file.setdefault(node.metadata["file_hash"], []).append((node.node_id, node.get_content()))
+                    for file_hash, chunks in by_file.items():
+                        bm25_index.add(file_hash, chunks)
+                with lock:
+                    for node in batch:
+                        state[node.metadata["file_hash"]]["written_ids"].append(node.node_id)
+                report(batch, "points_written")
+            except Exception as e:
+                logging.error(f"Error escribiendo en Qdrant: {str(e)}")
+                fail({node.metadata["file_hash"] for node in batch}, e)
+
+    embed_thread = threading.Thread(target=embed_stage, daemon=True)
+    write_thread = threading.Thread(target=write_stage, daemon=True)
+    embed_thread.start()
+    write_thread.start()
+
+    try:
+        _parse_in_order(items, state, fail, uploaded_at, embed_queue, progress)
+    finally:
+        embed_queue.put(_STOP)
+        embed_thread.join()
+        write_thread.join()
+
+    results = []
+    for item in items:
+        file_state = state[item["file_hash"]]
+        if file_state["error"] is None and len(file_state["written_ids"]) == len(file_state["node_ids"]):
+            tenant.manifest.add(item["file_hash"], {
+                "filename": item["filename"],
+                "stored_name": os.path.basename(item["file_path"]),
+                "size": os.path.getsize(item["file_path"]),
+                "page_count": file_state["page_count"],
+                "node_ids": file_state["node_ids"],
+                "ingested_at": datetime.fromtimestamp(uploaded_at).isoformat(),
+            })
+            results.append({"status": "success"})
+        else:
+            _discard(tenant, item, file_state["node_ids"])
+            error = file_state["error"] or "no se escribieron todos los chunks"
+            results.append({"status": "error", "detail": f"Error al procesar el documento: {error}"})
+    return results
+
+def _parse_in_order(items, state, fail, uploaded_at, embed_queue, progress):
+    """
+    Reparte cada PDF en tramos de PARSE_PAGES_PER_TASK páginas entre el pool de procesos y
+    entrega los nodos de cada archivo a la etapa de embeddings en orden de página (asignando
+    chunk_index). Los tramos pendientes (en el pool o esperando a uno anterior) están acotados
+    a 2 por worker, y la cola de embeddings es acotada: la memoria no depende del tamaño del PDF.
+    """
+    pool = _get_parse_pool()
+    tasks = []
+    for item in items:
+        file_hash = item["file_hash"]
+        try:
+            page_count = pdf_page_count(item["file_path"])
+        except Exception as e:
+            fail([file_hash], e)
+            continue
+        state[file_hash].update(page_count=page_count, chunks=0, next_page=0, ready={})
+        for start in range(0, page_count, PARSE_PAGES_PER_TASK):
+            tasks.append((item["file_path"], item["filename"], file_hash, start, min(start + PARSE_PAGES_PER_TASK, page_count)))
+    tasks.reverse()
+
+    max_pending = 2 * INGEST_PARSE_WORKERS
+    running = {}
+    buffered = 0
+    while tasks or running:
+        while tasks and len(running) + buffered < max_pending:
+            file_path, filename, file_hash, start, stop = tasks.pop()
+            if state[file_hash]["error"] is None:
+                future = pool.submit(parse_pdf_pages_timed, file_path, file_hash, start, stop, filename)
+                running[future] = (file_hash, start, stop)
+        if not running:
+            continue
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            file_hash, start, stop = running.pop(future)
+            file_state = state[file_hash]
+            try:
+                seconds, nodes = future.result()
+                # Tiempo de parseo medido en el worker (sin la espera en la cola del pool)
+                observe("ingest", "parse", seconds, chunks=len(nodes), pages=stop - start)
+                file_state["ready"][start] = (stop, nodes)
+                buffered += 1
+            except Exception as e:
+                fail([file_hash], e)
+            if file_state["error"] is not None:
+                buffered -= len(file_state["ready"])
+                file_state["ready"].clear()
+                continue
+            # Se liberan los tramos contiguos desde la próxima página esperada
+            while file_state["next_page"] in file_state["ready"]:
+                stop, nodes = file_state["ready"].pop(file_state["next_page"])
+                buffered -= 1
+                for node in nodes:
+                    node.metadata["chunk_index"] = file_state["chunks"]
+                    node.metadata["uploaded_at"] = uploaded_at
+                    file_state["chunks"] += 1
+                file_state["node_ids"].extend(node.node_id for node in nodes)
+                if progress is not None:
+                    progress(file_hash, pages_parsed=stop - file_state["next_page"], chunks_total=len(nodes))
+                file_state["next_page"] = stop
+                if nodes:
+                    embed_queue.put(nodes)
+
+def _discard(tenant, item, node_ids):
+    """Elimina los puntos del archivo (ids deterministas), sus términos BM25 y el PDF de un archivo que falló a mitad de camino.
+    El PDF se guardó como <hash>.pdf en esta carga (save_upload rechaza hashes ya ingestados), así que no es de otro documento."""
+    try:
+        if node_ids:
+            tenant.vector_store().client.delete(
+                collection_name=tenant.collection_name,
+                points_selector=PointIdsList(points=node_ids)
+            )
+    except Exception as e:
+        logging.error(f"Error limpiando puntos de {item['filename']}: {str(e)}")
+    tenant.bm25_index.remove(item["file_hash"])
+    if os.path.exists(item["file_path"]):
+        os.remove(item["file_path"])
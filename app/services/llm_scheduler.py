@@ -0,0 +1,147 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ..config import (
+    LLM_MAX_CONCURRENCY, LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE,
+    LLM_TOKENS_PER_REQUEST, LLM_MAX_RETRIES, LLM_RETRY_BASE_DELAY, LLM_RETRY_MAX_DELAY
+)
+
+
+class TokenBucket:
+    """
+    Token bucket thread-safe: se recarga a `rate_per_minute` por minuto y admite
+    ráfagas de hasta `capacity`. `acquire` bloquea hasta que hay saldo suficiente.
+    Con rate_per_minute <= 0 no limita.
+    """
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def acquire(self, amount=1):
+        if self.rate <= 0:
+            return
+        amount = min(amount, self.capacity)  # una petición más grande que la ráfaga espera a tener el bucket lleno
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                wait = (amount - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def _is_rate_limit_error(error):
+    """Detecta un 429 de Groq/OpenAI (sus SDKs exponen status_code; los wrappers a veces solo el mensaje)."""
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if status == 429:
+        return True
+    message = str(error).lower()
+    return "429" in message or "rate limit" in message
+
+
+def _retry_after(error):
+    """Segundos indicados por el header Retry-After, si la respuesta lo trae."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMScheduler:
+    """
+    Ejecuta tareas que llaman al LLM en paralelo respetando las cuotas del proveedor:
+    concurrencia máxima, token buckets de requests y tokens por minuto, y reintentos
+    con backoff exponencial con jitter ante respuestas 429.
+    Es compartido por todos los requests, de modo que los límites son globales al proceso.
+    """
+
+    def __init__(self, max_concurrency, requests_per_minute, tokens_per_minute,
+                 max_retries, base_delay, max_delay):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._requests = TokenBucket(requests_per_minute)
+        self._tokens = TokenBucket(tokens_per_minute)
+        self._executor = None
+        self._lock = threading.Lock()
+        self._counters = {"calls": 0, "retries": 0, "rate_limited": 0, "failures": 0}
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="llm")
+            return self._executor
+
+    def _count(self, key):
+        with self._lock:
+            self._counters[key] += 1
+
+    def call(self, fn, *args, tokens=LLM_TOKENS_PER_REQUEST):
+        """Ejecuta `fn(*args)` en el hilo actual aplicando rate limit y reintentos ante 429.
+        `tokens` es la estimación de tokens (prompt + respuesta) que consume la tarea."""
+        for attempt in range(self.max_retries + 1):
+            self._requests.acquire()
+            self._tokens.acquire(tokens)
+            self._count("calls")
+            try:
+                return fn(*args)
+            except Exception as e:
+                if not _is_rate_limit_error(e) or attempt == self.max_retries:
+                    self._count("failures")
+                    raise
+                self._count("rate_limited")
+                self._count("retries")
+                # Full jitter: evita que todas las tareas reintenten a la vez
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                delay = max(delay, _retry_after(e) or 0)
+                logging.warning(f"LLM con rate limit (intento {attempt + 1}), reintentando en {delay:.1f}s")
+                time.sleep(delay)
+
+    def map(self, fn, items, tokens=LLM_TOKENS_PER_REQUEST):
+        """
+        Aplica `fn` a cada item en paralelo (hasta max_concurrency a la vez).
+        `tokens` es una estimación común o una lista con la estimación de cada item.
+        Devuelve una lista en el mismo orden que `items`; los items que fallan
+        quedan como la excepción correspondiente para que el llamador decida.
+        """
+        items = list(items)
+        if isinstance(tokens, int):
+            tokens = [tokens] * len(items)
+        executor = self._get_executor()
+        futures = [executor.submit(self.call, fn, item, tokens=cost) for item, cost in zip(items, tokens)]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def stats(self):
+        with self._lock:
+            return {"max_concurrency": self.max_concurrency, **self._counters}
+
+
+llm_scheduler = LLMScheduler(
+    max_concurrency=LLM_MAX_CONCURRENCY,
+    requests_per_minute=LLM_REQUESTS_PER_MINUTE,
+    tokens_per_minute=LLM_TOKENS_PER_MINUTE,
+    max_retries=LLM_MAX_RETRIES,
+    base_delay=LLM_RETRY_BASE_DELAY,
+    max_delay=LLM_RETRY_MAX_DELAY,
+)
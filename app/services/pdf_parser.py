@@ -0,0 +1,298 @@
+import os
+import re
+import time
+import uuid
+import weakref
+from llama_index.core import Settings, Document
+from llama_index.core.node_parser import SentenceSplitter
+from llama_index.core.node_parser.node_utils import build_nodes_from_splits
+from llama_index.core.readers.file.base import default_file_metadata_func
+from llama_index.core.schema import MetadataMode
+from pypdf import PdfReader, PageObject
+from pypdf.generic import DictionaryObject, IndirectObject, NameObject
+
+# Metadatos internos que no deben contaminar el texto que se embebe ni el prompt del LLM.
+# page_number (1..n) y uploaded_at (epoch) existen para filtrar en Qdrant desde /query.
+INTERNAL_METADATA_KEYS = ["file_hash", "chunk_index", "page_number", "uploaded_at"]
+# Los mismos que excluía SimpleDirectoryReader: solo file_path y page_label llegan al embedding y al LLM
+FILE_METADATA_KEYS = ["file_name", "file_type", "file_size", "creation_date", "last_modified_date", "last_accessed_date"]
+
+HEADING = re.compile(
+    r"^((\d+\.)+\d*|\d+\)|[IVXLC]+\.|(cap[ií]tulo|secci[oó]n|art[ií]culo|anexo|chapter|section)\b)\s*\S",
+    re.IGNORECASE
+)
+TABLE_CELL_GAP = re.compile(r"\S(\t| {2,}|\s\|\s)\S")
+
+def _node_id(doc, index):
+    """ID determinista del nodo (y del punto en Qdrant): uuid5 del id de la página y la posición del chunk.
+    Como el id de la página deriva del hash del archivo, re-ingestar el mismo PDF sobreescribe los mismos puntos."""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{doc.id_}:{index}"))
+
+# Último PDF abierto en este proceso: los workers del pool reciben tramos del mismo archivo en
+# orden creciente, así que el recorrido del árbol de páginas sigue desde donde quedó en lugar
+# de empezar de nuevo (solo vuelve al principio si llega un tramo anterior).
+_reader_slot = {"key": None, "stream": None, "reader": None, "pages": None, "position": 0}
+# pypdf guarda cada objeto que resuelve (páginas, contenidos, fuentes) en reader.resolved_objects:
+# se vacía cada tantas páginas recorridas para que la memoria no crezca con el tamaño del PDF.
+READER_CACHE_PAGES = 256
+INHERITABLE_PAGE_ATTRIBUTES = ("/Resources", "/MediaBox", "/CropBox", "/Rotate")
+
+def pdf_page_count(file_path):
+    """Número de páginas (solo lee el árbol de páginas, no el contenido)."""
+    with open(file_path, "rb") as stream:
+        return len(PdfReader(stream).pages)
+
+# Etiquetas de todo el documento por reader, solo si falta el helper privado de pypdf
+_fallback_labels = weakref.WeakKeyDictionary()
+
+def _page_label(reader, page_index):
+    # reader.page_labels aplana todo el árbol de páginas; index2label solo lee /PageLabels.
+    # Es un módulo privado (probado con pypdf 5.9, ver requirements.txt): si otra versión no lo
+    # tiene se usa reader.page_labels, calculado una sola vez por reader.
+    try:
+        from pypdf._page_labels import index2label
+    except ImportError:
+        if reader not in _fallback_labels:
+            _fallback_labels[reader] = reader.page_labels
+        return _fallback_labels[reader][page_index]
+    return index2label(reader, page_index)
+
+def _walk_pages(reader, start):
+    """
+    Genera (índice, PageObject) desde la página `start` recorriendo el árbol de páginas en orden,
+    sin aplanarlo (reader.pages guarda un PageObject por página del PDF). Los subárboles
+    anteriores a `start` se saltean con su /Count. Solo se retienen los nodos del camino actual.
+    """
+    index, visited = 0, 0
+    stack = [(iter([reader.root_object.raw_get("/Pages")]), {})]
+    while stack:
+        kids, inherited = stack[-1]
+        ref = next(kids, None)
+        if ref is None:
+            stack.pop()
+            continue
+        node = ref.get_object()
+        if not isinstance(node, DictionaryObject):
+            continue  # hijo inválido en un PDF dañado (pypdf también lo ignora)
+        if node.get("/Type") == "/Pages" or ("/Type" not in node and "/Kids" in node):
+            count = node.get("/Count")
+            if isinstance(count, int) and 0 < count <= start - index:
+                index += count
+                continue
+            node_inherited = dict(inherited)
+            node_inherited.update((name, node[name]) for name in INHERITABLE_PAGE_ATTRIBUTES if name in node)
+            stack.append((iter(node["/Kids"]), node_inherited))
+            continue
+        if index >= start:
+            page = PageObject(reader, ref if isinstance(ref, IndirectObject) else None)
+            page.update(node)
+            for name, value in inherited.items():
+                if name not in page:
+                    page[NameObject(name)] = value
+            yield index, page
+        index += 1
+        visited += 1
+        if visited % READER_CACHE_PAGES == 0:
+            reader.resolved_objects.clear()
+
+def _shared_walk(file_path, start):
+    """Recorrido de páginas del PDF compartido entre tramos, ubicado en `start` o antes
+    (el PDF queda abierto como archivo, sin copiarlo a memoria)."""
+    stat = os.stat(file_path)
+    key = (file_path, stat.st_size, stat.st_mtime)
+    if _reader_slot["key"] != key:
+        if _reader_slot["stream"] is not None:
+            _reader_slot["stream"].close()
+        _reader_slot.update(key=None, stream=None, reader=None, pages=None, position=0)
+        stream = open(file_path, "rb")
+        _reader_slot.update(key=key, stream=stream, reader=PdfReader(stream))
+    if _reader_slot["pages"] is None or start < _reader_slot["position"]:
+        _reader_slot.update(pages=_walk_pages(_reader_slot["reader"], start), position=start)
+    return _reader_slot["reader"], _reader_slot["pages"]
+
+def _iter_shared(file_path, start, stop):
+    reader, pages = _shared_walk(file_path, start)
+    try:
+        for page_index, page in pages:
+            _reader_slot["position"] = page_index + 1
+            if page_index < start:
+                continue
+            yield reader, page_index, page
+            if stop is not None and page_index + 1 >= stop:
+                return
+    except Exception:
+        _reader_slot["pages"] = None  # el recorrido quedó cortado: el próximo tramo empieza uno nuevo
+        raise
+
+def iter_pages(file_path, file_hash, start=0, stop=None, reuse_reader=False, file_name=None):
+    """
+    Genera las páginas [start, stop) del PDF como Document de a una (con los mismos metadatos
+    que SimpleDirectoryReader e ids derivados del hash). El PDF se lee desde el archivo abierto
+    (no se copia a memoria), el árbol de páginas se recorre sin aplanarlo y pypdf resuelve el
+    contenido de cada página recién al extraer su texto: en memoria quedan la tabla xref y los
+    objetos resueltos de a lo sumo READER_CACHE_PAGES páginas, sin importar el tamaño del PDF.
+    `file_name` es el nombre con el que se subió el PDF (en disco se guarda como <hash>.pdf);
+    va en file_name y file_path de los metadatos.
+    """
+    file_metadata = default_file_metadata_func(file_path)
+    if file_name:
+        file_metadata.update(file_name=file_name, file_path=file_name)
+    if reuse_reader:
+        for reader, page_index, page in _iter_shared(file_path, start, stop):
+            yield _page_document(reader, page_index, page, file_hash, file_metadata)
+        return
+    with open(file_path, "rb") as stream:
+        reader = PdfReader(stream)
+        for page_index, page in _walk_pages(reader, start):
+            if stop is not None and page_index >= stop:
+                return
+            yield _page_document(reader, page_index, page, file_hash, file_metadata)
+
+def _page_document(reader, page_index, page, file_hash, file_metadata):
+    doc = Document(
+        text=page.extract_text() or "",
+        metadata={"page_label": _page_label(reader, page_index), **file_metadata},
+        excluded_embed_metadata_keys=[*FILE_METADATA_KEYS, *INTERNAL_METADATA_KEYS],
+        excluded_llm_metadata_keys=[*FILE_METADATA_KEYS, *INTERNAL_METADATA_KEYS],
+    )
+    doc.id_ = f"{file_hash}-{page_index}"
+    doc.metadata["file_hash"] = file_hash
+    doc.metadata["page_number"] = page_index + 1
+    return doc
+
+def _is_heading(line):
+    if len(line) > 100 or line.endswith((".", ",", ";", ":")):
+        return False
+    letters = [c for c in line if c.isalpha()]
+    return bool(HEADING.match(line)) or (len(letters) >= 3 and all(c.isupper() for c in letters))
+
+def _is_table_row(line):
+    return line.count("|") >= 2 or len(TABLE_CELL_GAP.findall(line)) >= 2
+
+def split_blocks(text):
+    """Divide el texto de una página en bloques ("heading" | "table" | "paragraph", texto).
+    Las filas de tabla consecutivas forman un solo bloque; una línea en blanco corta un párrafo."""
+    blocks = []
+    kind, lines = None, []
+
+    def close():
+        if lines:
+            blocks.append((kind, "\n".join(lines)))
+
+    for raw in text.splitlines():
+        line = raw.strip()
+        if not line:
+            close()
+            kind, lines = None, []
+            continue
+        line_kind = "table" if _is_table_row(raw) else "heading" if _is_heading(line) else "paragraph"
+        if line_kind == "heading" or line_kind != kind:
+            close()
+            kind, lines = line_kind, []
+        lines.append(raw.rstrip() if line_kind == "table" else line)
+    close()
+    return blocks
+
+def chunk_blocks(blocks, budget, overlap=0):
+    """
+    Agrupa bloques en chunks de como máximo `budget` tokens respetando la estructura:
+    un título abre un chunk nuevo y queda junto al contenido que lo sigue, una tabla no se
+    corta si entra entera (si no, se parte por filas repitiendo la cabecera) y solo los
+    párrafos más largos que el presupuesto se dividen por oraciones.
+    """
+    count = lambda text: len(Settings.tokenizer(text))
+    chunks, current, used = [], [], 0
+    has_body = False
+
+    def flush():
+        nonlocal current, used, has_body
+        if current:
+            chunks.append("\n".join(current))
+        current, used, has_body = [], 0, False
+
+    for kind, text in blocks:
+        tokens = count(text)
+        if kind == "heading":
+            if has_body:
+                flush()
+            current.append(text)
+            used += tokens
+            continue
+        if used + tokens <= budget:
+            current.append(text)
+            used += tokens
+            has_body = True
+            continue
+        if has_body:
+            flush()
+        if used + tokens <= budget:
+            current.append(text)
+            used += tokens
+            has_body = True
+        elif kind == "table":
+            header, *rows = text.split("\n")
+            for row in rows or [""]:
+                row_tokens = count(row)
+                if has_body and used + row_tokens > budget:
+                    flush()
+                if not has_body:
+                    current.append(header)
+                    used += count(header)
+                current.append(row)
+                used += row_tokens
+                has_body = True
+        else:
+            # Párrafo más largo que el chunk: los títulos pendientes van al comienzo del primer trozo
+            prefix = "\n".join(current)
+            current, used = [], 0
+            splitter = SentenceSplitter(chunk_size=budget, chunk_overlap=min(overlap, budget // 2))
+            chunks.extend(splitter.split_text(f"{prefix}\n{text}" if prefix else text))
+    flush()
+    return [chunk for chunk in chunks if chunk.strip()]
+
+def build_page_nodes(doc):
+    """Chunks de una página con ids deterministas, los metadatos de la página y sus offsets."""
+    metadata_tokens = len(Settings.tokenizer(doc.get_metadata_str(mode=MetadataMode.EMBED)))
+    budget = max(Settings.chunk_size - metadata_tokens, 64)
+    chunks = chunk_blocks(split_blocks(doc.text), budget, Settings.chunk_overlap)
+    nodes = build_nodes_from_splits(chunks, doc, id_func=lambda i, page: _node_id(page, i))
+    position = 0
+    for node in nodes:
+        node.metadata = dict(doc.metadata)
+        start = doc.text.find(node.text[:50], position)
+        if start >= 0:
+            node.start_char_idx, node.end_char_idx = start, start + len(node.text)
+            position = start
+    return nodes
+
+def parse_pdf_pages(file_path, file_hash, start, stop, file_name=None):
+    """
+    Parsea y divide las páginas [start, stop) de un PDF. Es una función de módulo sin
+    dependencias del vector store para poder ejecutarse en un pool de procesos; la ingesta
+    reparte cada PDF en tramos de PARSE_PAGES_PER_TASK páginas.
+    Devuelve los nodos (sin chunk_index: lo asigna quien junta los tramos en orden).
+    """
+    nodes = []
+    for doc in iter_pages(file_path, file_hash, start, stop, reuse_reader=True, file_name=file_name):
+        nodes.extend(build_page_nodes(doc))
+    return nodes
+
+def parse_pdf_pages_timed(file_path, file_hash, start, stop, file_name=None):
+    """parse_pdf_pages que además devuelve cuánto tardó en el worker: (segundos, nodos)."""
+    started = time.perf_counter()
+    nodes = parse_pdf_pages(file_path, file_hash, start, stop, file_name)
+    return time.perf_counter() - started, nodes
+
+def parse_pdf(file_path, file_hash, file_name=None):
+    """
+    Parsea y divide un PDF completo en el proceso actual.
+    Devuelve (número de páginas, nodos).
+    """
+    nodes = []
+    page_count = 0
+    for doc in iter_pages(file_path, file_hash, file_name=file_name):
+        nodes.extend(build_page_nodes(doc))
+        page_count += 1
+    for chunk_index, node in enumerate(nodes):
+        node.metadata["chunk_index"] = chunk_index
+    return page_count, nodes
@@ -1,11 +1,18 @@
 import os
 import shutil
+import threading
 from fastapi import HTTPException
 import hashlib
-from llama_index.core import SimpleDirectoryReader, StorageContext, VectorStoreIndex
-from llama_index.core.storage.docstore import SimpleDocumentStore
-from ..config import UPLOAD_DIR, PERSIST_DIR, COLLECTION_NAME
-from ..vector_store import get_vector_store
+from ..config import QDRANT_LOCAL_PATH
+from ..models_config import embedding_signature
+from ..vector_store import reset_collection
+from ..telemetry import span
+from ..tenants import TENANTS_DIR
+from .ingest_pipeline import ingest_files
+
+# (tenant, hash) de archivos que se están ingestando (evita duplicados dentro de una misma carga)
+_in_progress = set()
+_in_progress_lock = threading.Lock()
 
 def _get_file_hash(file_obj):
     """Genera un hash SHA256 para identificar el contenido del archivo"""
@@ -16,58 +23,110 @@ def _get_file_hash(file_obj):
     file_obj.seek(0)  # Volver al inicio para poder guardarlo después
     return hash_sha256.hexdigest()
 
-def process_pdf(file):
+def save_upload(tenant, file):
+    """
+    Valida el PDF, descarta duplicados con el manifiesto del tenant y lo guarda en su carpeta de PDFs
+    como <hash>.pdf: dos PDFs distintos con el mismo nombre no se pisan (el nombre original queda
+    en el manifiesto y en los metadatos de los chunks).
+    Devuelve el item que consume `ingest_files`. El hash queda reservado hasta `release_upload`.
+    """
     if not file.filename.endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Solo se permiten archivos PDF")
-    
+
     file_hash = _get_file_hash(file.file)
-    for existing_file in os.listdir(UPLOAD_DIR):
-        existing_path = os.path.join(UPLOAD_DIR, existing_file)
-        with open(existing_path, "rb") as f:
-            if _get_file_hash(f) == file_hash:
-                raise HTTPException(
-                    status_code=400, 
-                    detail=f"El documento '{file.filename}' ya fue subido anteriormente."
-                )
-
-    file_path = os.path.join(UPLOAD_DIR, file.filename)
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    with _in_progress_lock:
+        if file_hash in tenant.manifest or (tenant.id, file_hash) in _in_progress:
+            raise HTTPException(
+                status_code=400, 
+                detail=f"El documento '{file.filename}' ya fue subido anteriormente."
+            )
+        _in_progress.add((tenant.id, file_hash))
 
+    # Ruta absoluta: los workers del pool de parseo no dependen del directorio de trabajo
+    file_path = os.path.abspath(os.path.join(tenant.upload_dir, f"{file_hash}.pdf"))
     try:
-        documents = SimpleDirectoryReader(input_dir=UPLOAD_DIR).load_data()
-        vector_store = get_vector_store()
-
-        storage_context = StorageContext.from_defaults(
-            vector_store=vector_store,
-        )
-        index = VectorStoreIndex.from_documents(
-            documents,
-            vector_store=vector_store,
-            storage_context=storage_context
-        )
-        index.storage_context.persist(persist_dir=PERSIST_DIR)
+        with open(file_path, "wb") as buffer:
+            shutil.copyfileobj(file.file, buffer)
+    except Exception:
+        release_upload(tenant, file_hash)
+        raise
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error al procesar el documento: {str(e)}")
+    return {"filename": os.path.basename(file.filename), "file_path": file_path, "file_hash": file_hash}
+
+def discard_upload(tenant, item):
+    """Descarta un upload guardado que no llegará a ingestarse."""
+    if os.path.exists(item["file_path"]):
+        os.remove(item["file_path"])
+    release_upload(tenant, item["file_hash"])
+
+def release_upload(tenant, file_hash):
+    with _in_progress_lock:
+        _in_progress.discard((tenant.id, file_hash))
+
+def process_files(tenant, items, progress=None):
+    """
+    Ingesta un lote de uploads ya guardados del tenant y libera sus reservas.
+    El cache de respuestas se invalida al terminar (también si falló: los puntos escritos a mitad
+    de camino fueron visibles para las consultas hasta que se descartaron); las respuestas que
+    se estén calculando con el índice anterior ya no se guardan (ver AnswerCache.generation).
+    Si la colección se ingestó con otro modelo de embeddings el lote se rechaza (ver Tenant.check_embedding).
+    """
+    try:
+        try:
+            tenant.check_embedding(embedding_signature(), record=True)
+        except HTTPException as e:
+            for item in items:
+                discard_upload(tenant, item)
+            return [{"status": "error", "detail": e.detail} for _ in items]
+        with span("ingest", "total", documents=len(items)) as s:
+            results = ingest_files(tenant, items, progress=progress)
+            s.set(failed=sum(result["status"] == "error" for result in results))
+        return results
+    finally:
+        tenant.answer_cache.clear()
+        for item in items:
+            release_upload(tenant, item["file_hash"])
+
+def process_pdf(tenant, file):
+    item = save_upload(tenant, file)
+    result = process_files(tenant, [item])[0]
+    if result["status"] == "error":
+        raise HTTPException(status_code=500, detail=result["detail"])
+
+def _clear_persist_dir(tenant):
+    """Vacía la carpeta de persistencia del tenant. En la del tenant por defecto (PERSIST_DIR)
+    se conservan la carpeta de Qdrant embebido (el cliente la mantiene abierta y
+    reset_collection() ya la dejó vacía) y las carpetas de los demás tenants."""
+    os.makedirs(tenant.persist_dir, exist_ok=True)
+    keep = {os.path.abspath(QDRANT_LOCAL_PATH), os.path.abspath(os.path.join(tenant.persist_dir, TENANTS_DIR))}
+    for name in os.listdir(tenant.persist_dir):
+        path = os.path.join(tenant.persist_dir, name)
+        if tenant.is_default and os.path.abspath(path) in keep:
+            continue
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
 
-def reset_index():
+def reset_index(tenant):
+    """Elimina los PDFs, la colección y los índices del tenant; los demás tenants no se tocan."""
     try:
         # 1. Eliminar PDFs
-        for file in os.listdir(UPLOAD_DIR):
+        for file in os.listdir(tenant.upload_dir):
             if file.lower().endswith(".pdf"):
-                os.remove(os.path.join(UPLOAD_DIR, file))
+                os.remove(os.path.join(tenant.upload_dir, file))
 
-        # 2. Eliminar colección en Qdrant
-        vector_store = get_vector_store()
-        client = vector_store.client  # QdrantClient
-        client.delete_collection(collection_name=COLLECTION_NAME)
+        # 2. Vaciar colección en Qdrant (se recrea vacía para el cliente compartido)
+        reset_collection(tenant.collection_name)
 
-        if os.path.exists(PERSIST_DIR):
-            shutil.rmtree(PERSIST_DIR)  # borra toda la carpeta
-            os.makedirs(PERSIST_DIR, exist_ok=True)  # recrear carpeta vacía
+        _clear_persist_dir(tenant)
+        tenant.manifest.clear()
+        tenant.summary_store.clear()
+        tenant.relation_store.clear()
+        tenant.bm25_index.clear()
+        tenant.answer_cache.clear()
 
-        return {"status": "success", "message": "Índice y PDFs eliminados correctamente."}
+        return {"status": "success", "message": f"Índice y PDFs del tenant '{tenant.id}' eliminados correctamente."}
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al reiniciar el índice: {str(e)}")
\ No newline at end of file
@@ -1,65 +1,294 @@
 from fastapi import HTTPException
-from llama_index.core import StorageContext, VectorStoreIndex, SimpleDirectoryReader, Document
-from llama_index.core.postprocessor import SimilarityPostprocessor
+from llama_index.core import Settings, QueryBundle, get_response_synthesizer
+from llama_index.core.schema import NodeWithScore
 from llama_index.core.retrievers import VectorIndexRetriever
-from collections import defaultdict
 import logging
+import os
+import threading
+import time
 from datetime import datetime
 
-from ..config import PERSIST_DIR, COLLECTION_NAME, UPLOAD_DIR
-from ..vector_store import get_vector_store
-from ..prompts import SUMMARIZE_PROMPT, RELATION_PROMPT
+from ..config import ANSWER_CACHE_ENABLED, LLM_MODEL, LLM_MAX_CONCURRENCY, HYBRID_RRF_K, METRICS_ENABLED
+from ..config import RERANK_ENABLED, RERANK_CANDIDATES, CONTEXT_TOKEN_BUDGET
+from ..models_config import embedding_signature
+from ..telemetry import span, observe
+from .pdf_parser import iter_pages
+from ..prompts import SUMMARIZE_PROMPT
+from .summarizer import split_pages, summarize_texts
+from .corpus import iter_documents, source_name
+from .relations import analyze_relations
+from .retriever import FilteredQdrantRetriever, fetch_nodes, filter_scope, payload_filter
+from .reranker import rerank as rerank_nodes, pack_context, count_context_tokens
 
 
 SIMILARITY_THRESHOLD = 0.80
-def run_query(question: str):
-    try:
-        vector_store = get_vector_store()
-        client = vector_store.client
-        info = client.get_collection(collection_name=COLLECTION_NAME)
+TOP_K = 10
+RETRIEVAL_MODES = ("dense", "hybrid")
 
-        if info.vectors_count == 0:
-            raise HTTPException(status_code=404, detail="No hay documentos indexados.")
-        
-        storage_context = StorageContext.from_defaults(vector_store=vector_store)
-        index = VectorStoreIndex.from_vector_store(vector_store=vector_store, storage_context=storage_context)
+_synthesizers = {}
+_synthesizer_lock = threading.Lock()
 
-        query_engine = index.as_query_engine(
-            similarity_top_k=10,
-            node_postprocessing=[SimilarityPostprocessor(similarity_cutoff=SIMILARITY_THRESHOLD)]
-        )
+NO_INFO_ANSWER = "No encontré información relevante sobre esa pregunta en los documentos cargados."
 
-        response = query_engine.query(question)
+def get_synthesizer(streaming: bool = False):
+    """Sintetizador de respuestas construido una sola vez (uno normal y uno en streaming).
+    Es seguro reutilizarlo entre requests concurrentes: no guarda estado por consulta."""
+    if streaming not in _synthesizers:
+        with _synthesizer_lock:
+            if streaming not in _synthesizers:
+                _synthesizers[streaming] = get_response_synthesizer(streaming=streaming)
+    return _synthesizers[streaming]
 
-        sources = []
-        for n in (response.source_nodes or []):
-            score = getattr(n, "score", None)
-            if score is not None and score >= SIMILARITY_THRESHOLD:
-                sources.append({
-                    "score": score,
-                    "doc_id": getattr(n.node, "ref_doc_id", None),
-                    "snippet": (n.node.get_text() or "")[:200]
-                })
+def get_retriever(tenant, filters=None, top_k=TOP_K):
+    """Retriever denso sobre la colección del tenant, con el umbral SIMILARITY_THRESHOLD
+    y los filtros aplicados en Qdrant."""
+    return FilteredQdrantRetriever(tenant, top_k, score_threshold=SIMILARITY_THRESHOLD, filters=filters)
+
+def _build_sources(source_nodes, threshold=SIMILARITY_THRESHOLD):
+    sources = []
+    for n in (source_nodes or []):
+        score = getattr(n, "score", None)
+        if score is not None and (threshold is None or score >= threshold):
+            sources.append({
+                "score": score,
+                "doc_id": getattr(n.node, "ref_doc_id", None),
+                "snippet": (n.node.get_text() or "")[:200]
+            })
+    return sources
+
+def reciprocal_rank_fusion(rankings, k=HYBRID_RRF_K):
+    """Fusiona listas de ids ordenadas por relevancia: score = sum(1 / (k + posición))."""
+    scores = {}
+    for ranking in rankings:
+        for position, node_id in enumerate(ranking, 1):
+            scores[node_id] = scores.get(node_id, 0.0) + 1.0 / (k + position)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+def hybrid_retrieve(tenant, query_bundle, top_k=TOP_K, filters=None):
+    """
+    Recuperación híbrida: chunks densos que superan SIMILARITY_THRESHOLD más los mejores
+    chunks por BM25 (términos exactos: códigos, números de contrato, nombres), fusionados
+    con reciprocal rank fusion. Los nodos devueltos llevan el score RRF.
+    Los candidatos de BM25 pasan por los mismos filtros de payload que los densos.
+    """
+    with span("query", "search") as s:
+        dense = get_retriever(tenant, filters, top_k).retrieve(query_bundle)
+        s.set(chunks=len(dense))
+    with span("query", "bm25") as s:
+        # Con filtros se piden más candidatos a BM25: parte de ellos se descartará
+        sparse = tenant.bm25_index.search(query_bundle.query_str, top_k=top_k * 5 if payload_filter(filters) else top_k)
+        s.set(chunks=len(sparse))
+
+    nodes = {n.node.node_id: n.node for n in dense}
+    missing = [node_id for node_id, _ in sparse if node_id not in nodes]
+    with span("query", "fetch", chunks=len(missing)):
+        for node in fetch_nodes(tenant, missing, filters):
+            nodes[node.node_id] = node
+
+    fused = reciprocal_rank_fusion([
+        [n.node.node_id for n in dense],
+        [node_id for node_id, _ in sparse if node_id in nodes][:top_k]
+    ])
+    return [NodeWithScore(node=nodes[node_id], score=score) for node_id, score in fused[:top_k]]
+
+def _retrieve(tenant, query_bundle, mode, filters=None, top_k=TOP_K):
+    """Embedding de la pregunta (si el cache no lo calculó) y recuperación, medidos por separado."""
+    if query_bundle.embedding is None:
+        with span("query", "embed"):
+            query_bundle.embedding = Settings.embed_model.get_query_embedding(query_bundle.query_str)
+    with span("query", "retrieve", mode=mode) as s:
+        if mode == "hybrid":
+            nodes = hybrid_retrieve(tenant, query_bundle, top_k=top_k, filters=filters)
+        else:
+            nodes = get_retriever(tenant, filters, top_k).retrieve(query_bundle)
+        s.set(chunks=len(nodes))
+    return nodes
+
+def _sources_for(nodes, mode, reranked=False):
+    # En modo híbrido los scores son RRF y con rerank son del cross-encoder (no coseno);
+    # en todos los casos los nodos ya vienen filtrados
+    return _build_sources(nodes, None if mode == "hybrid" or reranked else SIMILARITY_THRESHOLD)
+
+def _rerank_and_pack(question, candidates):
+    """
+    Re-puntúa los candidatos con el cross-encoder y empaqueta los mejores en CONTEXT_TOKEN_BUDGET.
+    Devuelve (bloques para el LLM, reporte) con los tokens de contexto contra los que se habrían
+    enviado sin rerank (los TOP_K primeros candidatos) y la latencia que agrega el cross-encoder.
+    """
+    start = time.perf_counter()
+    with span("query", "rerank", chunks=len(candidates)):
+        ranked = rerank_nodes(question, candidates)
+    rerank_seconds = time.perf_counter() - start
+    with span("query", "pack") as s:
+        packed = pack_context(ranked, CONTEXT_TOKEN_BUDGET)
+        context_tokens = count_context_tokens(packed)
+        baseline_tokens = count_context_tokens(candidates[:TOP_K])
+        s.set(chunks=len(packed), prompt_tokens=context_tokens,
+              saved_tokens=max(baseline_tokens - context_tokens, 0))
+    return packed, {
+        "candidates": len(candidates),
+        "blocks": len(packed),
+        "context_tokens": context_tokens,
+        "baseline_tokens": baseline_tokens,
+        "saved_tokens": max(baseline_tokens - context_tokens, 0),
+        "rerank_ms": round(rerank_seconds * 1000, 1),
+    }
+
+def _cache_scope(mode, filters, rerank=False):
+    scope = filter_scope(filters)
+    mode = f"{mode}+rerank" if rerank else mode
+    return f"{mode}|{scope}" if scope else mode
+
+def _lookup_cached_answer(tenant, question: str, scope: str = ""):
+    """Busca la pregunta en el cache de respuestas del tenant.
+    Devuelve (respuesta cacheada o None, embedding de la pregunta si se calculó para la búsqueda semántica)."""
+    if not ANSWER_CACHE_ENABLED:
+        return None, None
+    with span("query", "cache_lookup") as s:
+        embedding = None
+        if tenant.answer_cache.semantic_enabled:
+            embedding = Settings.embed_model.get_query_embedding(question)
+        cached = tenant.answer_cache.get(question, embedding, scope=scope)
+        s.set(hit=cached is not None)
+    return cached, embedding
+
+def _check_mode(mode):
+    if mode not in RETRIEVAL_MODES:
+        raise HTTPException(status_code=400, detail=f"Modo de recuperación no soportado: {mode}")
+
+def run_query(tenant, question: str, mode: str = "dense", filters=None, rerank=None):
+    """
+    Responde la pregunta con los chunks del tenant que superan el umbral y cumplen `filters`
+    (ver retriever.FILTER_KEYS). Solo esos chunks llegan al LLM; si no queda ninguno
+    no se llama al LLM.
+
+    Con `rerank` (por defecto RERANK_ENABLED) se piden RERANK_CANDIDATES chunks, se re-puntúan
+    con el cross-encoder y al LLM llegan los mejores dentro de CONTEXT_TOKEN_BUDGET tokens;
+    el resultado incluye el reporte "rerank" (tokens ahorrados y latencia del cross-encoder).
+    """
+    rerank = RERANK_ENABLED if rerank is None else rerank
+    try:
+        _check_mode(mode)
+        if len(tenant.manifest) == 0:
+            raise HTTPException(status_code=404, detail="No hay documentos indexados.")
+        tenant.check_embedding(embedding_signature())
+
+        scope = _cache_scope(mode, filters, rerank)
+        # Generación del índice con la que se calcula la respuesta (ver AnswerCache.put)
+        generation = tenant.answer_cache.generation
+        cached, embedding = _lookup_cached_answer(tenant, question, scope=scope)
+        if cached is not None:
+            return cached
+
+        # Si ya se calculó el embedding para el cache, el retriever lo reutiliza
+        query_bundle = QueryBundle(question, embedding=embedding)
+        source_nodes = _retrieve(tenant, query_bundle, mode, filters, RERANK_CANDIDATES if rerank else TOP_K)
+        report = None
+        if rerank and source_nodes:
+            source_nodes, report = _rerank_and_pack(question, source_nodes)
+        sources = _sources_for(source_nodes, mode, reranked=rerank)
 
         if not sources:
-            return {
-                "answer": "No encontré información relevante sobre esa pregunta en los documentos cargados.",
+            result = {
+                "answer": NO_INFO_ANSWER,
                 "sources": []
             }
+        else:
+            # synthesize.llm: tiempo y tokens del LLM; synthesize.prompt: armado del prompt y del contexto
+            with span("query", "synthesize", track_llm=True, chunks=len(source_nodes)):
+                response = get_synthesizer().synthesize(query_bundle, source_nodes)
+            result = {
+                "answer": str(response),
+                "sources": sources
+            }
+        if report is not None:
+            result["rerank"] = report
 
-        return {
-            "answer": str(response),
-            "sources": sources
-        }
+        if ANSWER_CACHE_ENABLED:
+            tenant.answer_cache.put(question, result, embedding, scope=scope, generation=generation)
+        return result
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error en la consulta: {str(e)}")
 
+def stream_query(tenant, question: str, mode: str = "dense", filters=None, rerank=None):
+    """
+    Variante en streaming de run_query. Generador de eventos (dicts):
+    primero {"type": "sources"} apenas termina la recuperación (y el rerank), luego un
+    {"type": "token"} por cada fragmento que emite el LLM y al final {"type": "done"}.
+    """
+    _check_mode(mode)
+    if len(tenant.manifest) == 0:
+        raise HTTPException(status_code=404, detail="No hay documentos indexados.")
+    tenant.check_embedding(embedding_signature())
+
+    rerank = RERANK_ENABLED if rerank is None else rerank
+    scope = _cache_scope(mode, filters, rerank)
+    generation = tenant.answer_cache.generation
+    report = None
+    try:
+        cached, embedding = _lookup_cached_answer(tenant, question, scope=scope)
+        query_bundle = QueryBundle(question, embedding=embedding)
+        nodes = []
+        if cached is None:
+            nodes = _retrieve(tenant, query_bundle, mode, filters, RERANK_CANDIDATES if rerank else TOP_K)
+        if rerank and nodes:
+            nodes, report = _rerank_and_pack(question, nodes)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error en la consulta: {str(e)}")
 
-def summarize_docs():
+    def sources_event(sources, report):
+        event = {"type": "sources", "sources": sources}
+        if report is not None:
+            event["rerank"] = report
+        return event
+
+    def replay(result):
+        yield sources_event(result["sources"], result.get("rerank"))
+        yield {"type": "token", "token": result["answer"]}
+        yield {"type": "done"}
+
+    def events():
+        sources = _sources_for(nodes, mode, reranked=rerank)
+        if not sources:
+            result = {"answer": NO_INFO_ANSWER, "sources": []}
+            if report is not None:
+                result["rerank"] = report
+            if ANSWER_CACHE_ENABLED:
+                tenant.answer_cache.put(question, result, embedding, scope=scope, generation=generation)
+            yield from replay(result)
+            return
+        yield sources_event(sources, report)
+        try:
+            start = time.perf_counter()
+            response = get_synthesizer(streaming=True).synthesize(query_bundle, nodes)
+            tokens = []
+            for token in response.response_gen:
+                if not tokens:
+                    first_token = time.perf_counter() - start
+                tokens.append(token)
+                yield {"type": "token", "token": token}
+            # Hasta el último token: el LLM termina cuando se agota el generador
+            observe("query", "synthesize_stream", time.perf_counter() - start, chunks=len(nodes),
+                    first_token_seconds=round(first_token, 6) if tokens else None,
+                    completion_tokens=len(Settings.tokenizer("".join(tokens))) if METRICS_ENABLED else None)
+            if ANSWER_CACHE_ENABLED:
+                result = {"answer": "".join(tokens), "sources": sources}
+                if report is not None:
+                    result["rerank"] = report
+                tenant.answer_cache.put(question, result, embedding, scope=scope, generation=generation)
+            yield {"type": "done"}
+        except Exception as e:
+            # Los headers ya se enviaron: el error viaja como un evento más
+            yield {"type": "error", "detail": f"Error en la consulta: {str(e)}"}
+
+    return replay(cached) if cached is not None else events()
+
+def summarize_docs(tenant):
     try:
-        vector_store = get_vector_store()
-        storage_context = StorageContext.from_defaults(vector_store=vector_store, persist_dir=PERSIST_DIR)
-        index = VectorStoreIndex.from_vector_store(vector_store=vector_store, storage_context=storage_context)
+        index = tenant.index()
         
         # docs = index.storage_context.docstore.docs.values()
         docs = list(index.docstore.docs.values())
@@ -159,99 +388,105 @@ def summarize_docs():
             detail=f"Error al generar resúmenes: {str(e)}"
         )
      
-def summarize_docs_alternative():
+def _load_chunks(tenant, entry):
+    """Trozos para resumir un documento del manifiesto (solo parseo, sin embeddings).
+    Las páginas se leen de a una; solo se guardan los trozos y las estadísticas."""
+    # Los PDFs subidos antes de guardarlos como <hash>.pdf conservan su nombre original
+    stored_name = entry.get("stored_name") or os.path.basename(entry["filename"])
+    file_path = os.path.abspath(os.path.join(tenant.upload_dir, stored_name))
+    stats = {"page_count": 0, "total_characters": 0}
+
+    def texts():
+        for page in iter_pages(file_path, entry["file_hash"], file_name=entry["filename"]):
+            stats["page_count"] += 1
+            stats["total_characters"] += len(page.text.strip())
+            yield page.text
+
+    return split_pages(texts()), stats
+
+def _summary_data(entry, stats, result):
+    filename = entry["filename"]
+    return {
+        "doc_id": filename.replace('.pdf', '') if filename.endswith('.pdf') else filename,
+        "filename": filename,
+        "file_hash": entry["file_hash"],
+        "summary": result["summary"],
+        "page_count": stats["page_count"],
+        "total_characters": stats["total_characters"],
+        "llm_calls": result["llm_calls"],
+        "prompt_tokens": result["prompt_tokens"],
+        "completion_tokens": result["completion_tokens"],
+        "metadata": {
+            'file_name': filename,
+            'page_count': stats["page_count"],
+            'processing_date': str(datetime.now())
+        }
+    }
+
+def summarize_docs_alternative(tenant):
     """
-    Método alternativo que recarga los documentos desde el directorio
+    Resume cada documento del manifiesto del tenant con un map-reduce directo sobre sus páginas
+    (sin índice vectorial). Los resúmenes se guardan por hash de contenido: solo se llama
+    al LLM para documentos nuevos (o si cambió el LLM configurado), el resto se sirve
+    desde el almacenamiento. Cada resumen informa las llamadas al LLM y los tokens usados.
     """
     try:
-
-        # Si tienes acceso al directorio original de documentos
-        documents_dir = UPLOAD_DIR # Cambia por tu directorio
-        
-        # Cargar documentos originales
-        reader = SimpleDirectoryReader(documents_dir)
-        documents = reader.load_data()
-        
-        if not documents:
+        entries = tenant.manifest.entries()
+        summary_store = tenant.summary_store
+        if not entries:
             raise HTTPException(
                 status_code=404, 
                 detail="No hay documentos en el directorio."
             )
-        
-        docs_by_file = defaultdict(list)
-        for doc in documents:
-            filename = doc.metadata.get('file_name', 'unknown')
-            base_filename = filename.replace('.pdf', '') if filename.endswith('.pdf') else filename
-            docs_by_file[base_filename].append(doc)
-        
-        print(f"Archivos únicos encontrados: {list(docs_by_file.keys())}")
-        
-        
-        # Crear índice temporal solo para resúmenes
-        temp_index = VectorStoreIndex.from_documents(documents)
-        
-        summaries = []
-        for filename, pages in docs_by_file.items():
+
+        cached = {entry["file_hash"]: summary_store.get(entry["file_hash"], model=LLM_MODEL) for entry in entries}
+        missing = [entry for entry in entries if cached[entry["file_hash"]] is None]
+
+        stats_by_hash, chunks_by_hash = {}, {}
+        for entry in missing:
             try:
-                print(f"Procesando archivo: {filename} con {len(pages)} páginas")
-                
-                combined_text = ""
-                total_chars = 0
-                
-                for page in pages:
-                    page_text = page.text.strip()
-                    if page_text:
-                        combined_text += f"\n\n{page_text}"
-                        total_chars += len(page_text)
-                
-                if not combined_text.strip():
-                    print(f"Sin contenido para {filename}")
-                    continue
-                
-                # Crear un documento combinado para este PDF
-                combined_doc = Document(
-                    text=combined_text,
-                    metadata={
-                        'file_name': filename,
-                        'page_count': len(pages),
-                        'total_characters': total_chars
-                    }
-                )
-                
-                # Crear índice temporal para este documento específico
-                temp_index = VectorStoreIndex.from_documents([combined_doc])
-                
-                # Configurar query engine con el template corregido
-                query_engine = temp_index.as_query_engine(
-                    text_qa_template=SUMMARIZE_PROMPT,
-                    similarity_top_k=3,
-                    response_mode="compact"
-                )
-                
-                # Query específica para este documento
-                query = "Proporciona un resumen completo y estructurado de este documento PDF."
-                summary = query_engine.query(query)
-                
-                summary_data = {
-                    "doc_id": filename,
-                    "filename": filename + ".pdf",
-                    "summary": str(summary),
-                    "page_count": len(pages),
-                    "total_characters": total_chars,
-                    "metadata": {
-                        'file_name': filename + ".pdf",
-                        'page_count': len(pages),
-                        'processing_date': str(datetime.now())
-                    }
-                }
-                
-                summaries.append(summary_data)
-                print(f"Resumen generado para {filename}")
-                
+                with span("summarize", "parse") as s:
+                    chunks, stats = _load_chunks(tenant, entry)
+                    s.set(chunks=len(chunks), pages=stats["page_count"])
             except Exception as doc_error:
-                print(f"Error procesando {filename}: {str(doc_error)}")
+                print(f"Error procesando {entry['filename']}: {str(doc_error)}")
                 continue
-        
+            if not chunks:
+                print(f"Sin contenido para {entry['filename']}")
+                continue
+            stats_by_hash[entry["file_hash"]] = stats
+            chunks_by_hash[entry["file_hash"]] = chunks
+
+        # Los documentos sin resumen se resumen en paralelo a través del planificador del LLM
+        with span("summarize", "map_reduce", chunks=sum(len(chunks) for chunks in chunks_by_hash.values())) as s:
+            generated = summarize_texts(chunks_by_hash)
+            done = [result for result in generated.values() if not isinstance(result, Exception)]
+            s.set(documents=len(done), llm_calls=sum(result["llm_calls"] for result in done),
+                  prompt_tokens=sum(result["prompt_tokens"] for result in done),
+                  completion_tokens=sum(result["completion_tokens"] for result in done))
+
+        summaries = []
+        for entry in entries:
+            file_hash = entry["file_hash"]
+            if cached[file_hash] is not None:
+                summaries.append(cached[file_hash]["data"])
+                continue
+            result = generated.get(file_hash)
+            if result is None:
+                continue
+            if isinstance(result, Exception):
+                print(f"Error procesando {entry['filename']}: {str(result)}")
+                continue
+            summary_data = _summary_data(entry, stats_by_hash[file_hash], result)
+            summary_store.put(file_hash, {"model": LLM_MODEL, "data": summary_data})
+            summaries.append(summary_data)
+            print(f"Resumen generado para {entry['filename']}: {result['llm_calls']} llamadas al LLM, "
+                  f"{result['prompt_tokens'] + result['completion_tokens']} tokens")
+
+        # Documentos eliminados o reemplazados: sus resúmenes ya no aplican
+        summary_store.prune({entry["file_hash"] for entry in entries})
+        print(f"Resúmenes: {len(entries) - len(missing)} desde almacenamiento, {len(missing)} por generar")
+
         if not summaries:
             raise HTTPException(
                 status_code=500,
@@ -260,115 +495,81 @@ def summarize_docs_alternative():
         
         return summaries
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500, 
             detail=f"Error en método alternativo: {str(e)}"
         )
     
-def summarize_from_existing_vectorstore():
+def summarize_from_existing_vectorstore(tenant):
     """
-    Método que intenta usar tu vector store existente de manera más directa
+    Resume los documentos directamente desde el vector store: recorre toda la colección del tenant
+    con scroll paginado (sin embeddings de consulta), agrupada por documento (file_hash), y resume
+    cada documento con un map-reduce sobre sus propios chunks (ver summarizer.summarize_texts),
+    sin query engine ni recuperación sobre el resto de la colección.
+    Los documentos se resumen de a LLM_MAX_CONCURRENCY: en memoria solo están los chunks de ese
+    grupo, así la memoria no crece con el tamaño de la colección.
     """
     try:
-        vector_store = get_vector_store()
-        storage_context = StorageContext.from_defaults(
-            vector_store=vector_store, 
-            persist_dir=PERSIST_DIR
-        )
-        index = VectorStoreIndex.from_vector_store(
-            vector_store=vector_store, 
-            storage_context=storage_context
-        )
-        
-        # Crear retriever para obtener todos los nodos posibles
-        retriever = VectorIndexRetriever(
-            index=index,
-            similarity_top_k=100  # Número alto
-        )
-        
-        # Queries múltiples para capturar diferentes tipos de contenido
-        queries = [
-            "contenido documento texto información",
-            "PDF archivo páginas contenido",
-            "datos información principal tema",
-            "resumen contenido principal documento"
-        ]
-        
-        all_nodes = []
-        for query in queries:
-            nodes = retriever.retrieve(query)
-            all_nodes.extend(nodes)
-        
-        if not all_nodes:
+        summaries = []
+        found = []
+
+        def summarize_batch(batch):
+            with span("summarize_vectorstore", "map_reduce", documents=len(batch)) as s:
+                generated = summarize_texts({doc["doc_id"]: doc["texts"] for doc in batch})
+                done = [result for result in generated.values() if not isinstance(result, Exception)]
+                s.set(llm_calls=sum(result["llm_calls"] for result in done),
+                      prompt_tokens=sum(result["prompt_tokens"] for result in done),
+                      completion_tokens=sum(result["completion_tokens"] for result in done))
+            for doc in batch:
+                result = generated[doc["doc_id"]]
+                if isinstance(result, Exception):
+                    print(f"❌ Error procesando {doc['source']}: {str(result)}")
+                    continue
+                summaries.append({
+                    "doc_id": doc["doc_id"],
+                    "source": doc["source"],
+                    "summary": result["summary"],
+                    "content_length": doc["content_length"],
+                    "chunks_count": len(doc["texts"]),
+                    "llm_calls": result["llm_calls"],
+                    "prompt_tokens": result["prompt_tokens"],
+                    "completion_tokens": result["completion_tokens"]
+                })
+                print(f"✅ Resumen generado para {doc['source']}")
+
+        batch = []
+        with span("summarize_vectorstore", "total") as s:
+            for source, nodes in iter_documents(tenant.collection_name):
+                texts = [node.get_content() for node in nodes]
+                content_length = sum(len(text.strip()) for text in texts)
+                found.append(source_name(nodes[0].metadata, source))
+                # Skip very short content
+                if content_length < 50:
+                    continue
+                batch.append({
+                    "doc_id": source,
+                    "source": found[-1],
+                    "texts": texts,
+                    "content_length": content_length
+                })
+                if len(batch) >= LLM_MAX_CONCURRENCY:
+                    summarize_batch(batch)
+                    batch = []
+            if batch:
+                summarize_batch(batch)
+            s.set(documents=len(found))
+
+        if not found:
             raise HTTPException(
                 status_code=404,
                 detail="No se encontraron nodos en el vector store"
             )
-        
-        # Agrupar nodos por documento fuente
-        docs_by_source = defaultdict(list)
-        for node in all_nodes:
-            # Intentar obtener información del documento fuente
-            source_info = "unknown"
-            if hasattr(node.node, 'metadata') and node.node.metadata:
-                source_info = node.node.metadata.get('file_name', 
-                             node.node.metadata.get('source', 'unknown'))
-            elif hasattr(node.node, 'ref_doc_id'):
-                source_info = node.node.ref_doc_id
-            
-            docs_by_source[source_info].append(node.node.text)
-        
-        print(f"Documentos únicos encontrados: {list(docs_by_source.keys())}")
-        
-        summaries = []
-        query_engine = index.as_query_engine(
-            similarity_top_k=10,
-            response_mode="tree_summarize"
-        )
-        
-        for source, texts in docs_by_source.items():
-            try:
-                # Combinar textos del mismo documento
-                combined_text = "\n\n".join(texts)
-                
-                if len(combined_text.strip()) < 50:  # Skip very short content
-                    continue
-                
-                # Query para resumen
-                query = f"""
-                Crea un resumen estructurado del siguiente contenido de documento:
-                
-                Fuente: {source}
-                
-                Contenido: {combined_text[:3000]}...
-                
-                El resumen debe incluir:
-                1. Tema principal
-                2. Puntos clave (3-5 puntos)
-                3. Información relevante
-                4. Conclusiones si las hay
-                
-                Mantén el resumen entre 150-300 palabras.
-                """
-                
-                summary = query_engine.query(query)
-                
-                summary_data = {
-                    "doc_id": source,
-                    "source": source,
-                    "summary": str(summary),
-                    "content_length": len(combined_text),
-                    "chunks_count": len(texts)
-                }
-                
-                summaries.append(summary_data)
-                print(f"✅ Resumen generado para {source}")
-                
-            except Exception as doc_error:
-                print(f"❌ Error procesando {source}: {str(doc_error)}")
-                continue
-        
+
+        print(f"Documentos únicos encontrados: {found}")
+
         if not summaries:
             raise HTTPException(
                 status_code=500,
@@ -386,26 +587,18 @@ def summarize_from_existing_vectorstore():
             detail=f"Error procesando vector store: {str(e)}"
         )
     
-def diagnose_index():
+def diagnose_index(tenant):
     """
-    Función de diagnóstico para entender qué contiene tu índice
+    Función de diagnóstico para entender qué contiene el índice del tenant
     """
     try:
-        vector_store = get_vector_store()
-        storage_context = StorageContext.from_defaults(
-            vector_store=vector_store, 
-            persist_dir=PERSIST_DIR
-        )
-        index = VectorStoreIndex.from_vector_store(
-            vector_store=vector_store, 
-            storage_context=storage_context
-        )
+        index = tenant.index()
         
         diagnosis = {
             "docstore_count": len(index.docstore.docs),
             "docstore_keys": list(index.docstore.docs.keys()),
-            "vector_store_type": type(vector_store).__name__,
-            "storage_context_exists": storage_context is not None
+            "vector_store_type": type(index.vector_store).__name__,
+            "storage_context_exists": index.storage_context is not None
         }
         
         # Intentar recuperar algunos nodos
@@ -420,9 +613,10 @@ def diagnose_index():
         print(f"Error en index: {str(e)}")
 
 # Función para analizar relaciones entre documentos
-def analyze_document_relations(summaries):
+def analyze_document_relations(tenant, summaries):
     """
     Analiza las relaciones entre documentos basándose en sus resúmenes
+    (cacheado por conjunto de documentos, ver services/relations.py)
     """
     try:
         
@@ -432,37 +626,9 @@ def analyze_document_relations(summaries):
                 "message": "Se necesitan al menos 2 documentos para analizar relaciones.",
                 "total_docs": len(summaries) if summaries else 0
             }
-        
-        # Preparar información de los documentos para el análisis
-        doc_info = []
-        combined_text = ""
-        for i, summary in enumerate(summaries, 1):
-            doc_info.append(f"""
-                DOCUMENTO {i}: {summary.get('filename', summary.get('doc_id', f'Documento {i}'))}
-                RESUMEN: {summary.get('summary', 'Sin resumen disponible')}
-                PÁGINAS: {summary.get('page_count', 'N/A')}
-                ---""")
-            combined_text += f"Documento {i}:\n\n{summary.get('filename', summary.get('doc_id', f'Documento {i}'))}"
-            combined_text += f"\n\n{summary.get('summary', 'Sin resumen disponible')}"
-            combined_text += "\n\n"
-            combined_text += "-"*50
-            combined_text += "\n\n"
-        combined_doc = Document(text=combined_text)
-        
-        # documents_text = "\n".join(doc_info)
-        temp_index = VectorStoreIndex.from_documents([combined_doc])
-        query_engine = temp_index.as_query_engine(
-                    text_qa_template=RELATION_PROMPT,
-                    similarity_top_k=2,
-                    response_mode="compact"
-                )
-        query = """
-            Analiza las relaciones temáticas, temporales, de contenido y funcionales entre estos documentos.
-            Incluye patrones, insights y conclusiones, sin inventar información que no esté en los resúmenes.
-            """
-        summary = query_engine.query(query)
 
-        return str(summary)
+        with span("relations", "total", documents=len(summaries)):
+            return analyze_relations(tenant, summaries)
 
     except Exception as doc_error:
         print(f"Error analizando relaciones: {str(doc_error)}")
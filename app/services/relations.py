@@ -0,0 +1,155 @@
+import hashlib
+import logging
+
+from ..config import (
+    LLM_MODEL, RELATION_CONTEXT_TOKENS, SUMMARY_MAX_LEVELS,
+    RELATION_GRAPH_MIN_DOCS, RELATION_SIMILARITY_THRESHOLD
+)
+from ..prompts import RELATION_PROMPT, RELATION_MERGE_PROMPT
+from ..telemetry import span
+from .llm_scheduler import llm_scheduler
+from .summarizer import SECTION_SEPARATOR, complete, count_tokens, pack_texts, truncate_tokens
+from .similarity_graph import build_similarity_graph
+
+
+def _document_name(position, summary):
+    # Los resúmenes del vector store traen el nombre en `source` (doc_id es el file_hash)
+    return summary.get('filename') or summary.get('source') or summary.get('doc_id', f'Documento {position}')
+
+
+def _document_block(position, summary):
+    return (
+        f"DOCUMENTO {position}: {_document_name(position, summary)}\n"
+        f"RESUMEN: {summary.get('summary', 'Sin resumen disponible')}\n"
+        f"PÁGINAS: {summary.get('page_count', 'N/A')}\n"
+        "---"
+    )
+
+
+def _document_key(summary):
+    """Identidad de un documento: su hash de contenido o, si no lo hay, el de su resumen."""
+    return summary.get("file_hash") or hashlib.sha256(summary.get("summary", "").encode("utf-8")).hexdigest()
+
+
+def relation_cache_key(summaries):
+    """Clave del conjunto de documentos (independiente del orden)."""
+    keys = sorted(_document_key(summary) for summary in summaries)
+    return hashlib.sha256("\n".join(keys).encode("utf-8")).hexdigest()
+
+
+def _reduce(blocks, prompt, budget, levels):
+    """Analiza los bloques con `prompt`: en una sola llamada si entran en `budget` tokens,
+    si no por grupos en paralelo, y combina los análisis parciales con RELATION_MERGE_PROMPT."""
+    groups = pack_texts(blocks, budget)
+    if len(groups) == 1 or levels >= SUMMARY_MAX_LEVELS:
+        context = truncate_tokens(SECTION_SEPARATOR.join(groups), budget)
+        return llm_scheduler.call(complete, prompt.format(context_str=context)), 1
+
+    outputs = llm_scheduler.map(complete, [prompt.format(context_str=group) for group in groups])
+    for output in outputs:
+        if isinstance(output, Exception):
+            raise output
+    partials = [f"ANÁLISIS DEL GRUPO {i}:\n{output.strip()}" for i, output in enumerate(outputs, 1)]
+    merged, calls = _reduce(partials, RELATION_MERGE_PROMPT, budget, levels + 1)
+    return merged, calls + len(groups)
+
+
+def _graph_clusters(tenant, summaries):
+    """Clusters del grafo de similitud expresados como índices de `summaries`,
+    o None si algún resumen no se puede ubicar en el grafo."""
+    graph = build_similarity_graph(tenant, RELATION_SIMILARITY_THRESHOLD)
+    # Los documentos del grafo se identifican por file_hash (ref_doc_id en puntos antiguos):
+    # los resúmenes del manifiesto traen file_hash y los del vector store, ese mismo id en doc_id
+    by_id = {doc["id"]: doc["cluster"] for doc in graph["documents"]}
+    clusters = {}
+    for i, summary in enumerate(summaries):
+        cluster = by_id.get(summary.get("file_hash") or summary.get("doc_id"))
+        if cluster is None:
+            return None
+        clusters.setdefault(cluster, []).append(i)
+    return list(clusters.values())
+
+
+def _analyze_clusters(summaries, blocks, clusters, budget):
+    """Solo se consulta al LLM por los clusters de documentos similares (2 o más);
+    los análisis de cada cluster se combinan en uno."""
+    related = [members for members in clusters if len(members) > 1]
+    isolated = [_document_name(i + 1, summaries[i]) for members in clusters if len(members) == 1 for i in members]
+    note = (
+        f"Documentos sin similitud alta con el resto (< {RELATION_SIMILARITY_THRESHOLD}): {', '.join(isolated)}"
+        if isolated else ""
+    )
+    if not related:
+        return f"No hay pares de documentos con similitud >= {RELATION_SIMILARITY_THRESHOLD}. {note}".strip(), 0
+
+    # Todas las llamadas de primer nivel (de todos los clusters) en paralelo
+    prompts, owners = [], []
+    for position, members in enumerate(related):
+        for group in pack_texts([blocks[i] for i in members], budget):
+            prompts.append(RELATION_PROMPT.format(context_str=group))
+            owners.append(position)
+    outputs = llm_scheduler.map(complete, prompts)
+    for output in outputs:
+        if isinstance(output, Exception):
+            raise output
+    calls = len(prompts)
+
+    by_cluster = {}
+    for position, output in zip(owners, outputs):
+        by_cluster.setdefault(position, []).append(output.strip())
+    partials = []
+    for position, members in enumerate(related):
+        analysis = by_cluster[position]
+        if len(analysis) > 1:
+            merged, merge_calls = _reduce(analysis, RELATION_MERGE_PROMPT, budget, levels=2)
+            analysis, calls = [merged.strip()], calls + merge_calls
+        names = ", ".join(_document_name(i + 1, summaries[i]) for i in members)
+        partials.append(f"CLUSTER {position + 1} ({names}):\n{analysis[0]}")
+
+    if len(partials) == 1:
+        result = partials[0]
+    else:
+        result, merge_calls = _reduce(partials, RELATION_MERGE_PROMPT, budget, levels=2)
+        calls += merge_calls
+    return f"{result.strip()}\n\n{note}".strip(), calls
+
+
+def analyze_relations(tenant, summaries, budget=RELATION_CONTEXT_TOKENS):
+    """
+    Análisis de relaciones entre documentos a partir de sus resúmenes, sin índice vectorial:
+    todos los resúmenes van directo a RELATION_PROMPT si entran en el contexto. Con muchos
+    documentos (o si no entran) se pre-agrupan con el grafo de similitud de centroides y
+    solo se analizan los clusters; sin grafo, se analizan por grupos en orden y los análisis
+    parciales se combinan de forma jerárquica.
+    El resultado se guarda (en el almacenamiento del tenant) por conjunto de documentos y modelo.
+    """
+    relation_store = tenant.relation_store
+    with span("relations", "cache_lookup") as s:
+        key = relation_cache_key(summaries)
+        cached = relation_store.get(key, model=LLM_MODEL)
+        s.set(hit=cached is not None)
+    if cached is not None:
+        return cached["data"]
+
+    blocks = [_document_block(position, summary) for position, summary in enumerate(summaries, 1)]
+    clusters = None
+    context_tokens = count_tokens(SECTION_SEPARATOR.join(blocks))
+    if len(summaries) > RELATION_GRAPH_MIN_DOCS or context_tokens > budget:
+        try:
+            with span("relations", "graph") as s:
+                clusters = _graph_clusters(tenant, summaries)
+                s.set(clusters=len(clusters) if clusters is not None else 0)
+        except Exception as e:
+            logging.error(f"No se pudo construir el grafo de similitud: {str(e)}")
+
+    with span("relations", "analyze", documents=len(summaries), context_tokens=context_tokens) as s:
+        if clusters is not None:
+            analysis, calls = _analyze_clusters(summaries, blocks, clusters, budget)
+        else:
+            analysis, calls = _reduce(blocks, RELATION_PROMPT, budget, levels=1)
+        s.set(llm_calls=calls)
+    print(f"Relaciones analizadas para {len(summaries)} documentos con {calls} llamadas al LLM")
+
+    analysis = analysis.strip()
+    relation_store.put(key, {"model": LLM_MODEL, "data": analysis})
+    return analysis
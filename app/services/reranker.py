@@ -0,0 +1,94 @@
+import re
+
+from llama_index.core import Settings
+from llama_index.core.schema import MetadataMode, NodeWithScore
+
+from ..config import RERANK_BATCH_SIZE, CONTEXT_TOKEN_BUDGET
+from ..models_config import get_reranker
+
+# Etapa opcional de /query: se piden más candidatos a Qdrant, un cross-encoder los re-puntúa
+# contra la pregunta y solo los mejores entran al prompt hasta CONTEXT_TOKEN_BUDGET tokens
+# (sin duplicados y con los chunks contiguos de un mismo archivo unidos en un solo bloque).
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def count_context_tokens(nodes):
+    """Tokens que ocupan los nodos en el prompt (texto más metadatos visibles para el LLM)."""
+    return sum(len(Settings.tokenizer(n.node.get_content(metadata_mode=MetadataMode.LLM))) for n in nodes)
+
+
+def rerank(question, nodes, batch_size=RERANK_BATCH_SIZE):
+    """Re-puntúa los nodos con el cross-encoder (por lotes) y los devuelve ordenados por ese score."""
+    if not nodes:
+        return []
+    pairs = [(question, n.node.get_content()) for n in nodes]
+    scores = get_reranker().predict(pairs, batch_size=batch_size, show_progress_bar=False)
+    ranked = [NodeWithScore(node=n.node, score=float(score)) for n, score in zip(nodes, scores)]
+    return sorted(ranked, key=lambda n: n.score, reverse=True)
+
+
+def _normalize(text):
+    return _WHITESPACE.sub(" ", text).strip().lower()
+
+
+def _position(node):
+    metadata = node.metadata or {}
+    return metadata.get("file_hash"), metadata.get("chunk_index")
+
+
+def _merge(run):
+    """Une chunks consecutivos de un archivo (ordenados por chunk_index) en un solo nodo.
+    Si dos chunks de la misma página se solapan (según sus offsets), el texto repetido va una sola vez."""
+    first = run[0].node
+    text = first.get_content()
+    previous = first
+    for n in run[1:]:
+        node, content = n.node, n.node.get_content()
+        overlap = 0
+        if node.ref_doc_id == previous.ref_doc_id and None not in (previous.end_char_idx, node.start_char_idx):
+            overlap = max(previous.end_char_idx - node.start_char_idx, 0)
+        if overlap and text.endswith(content[:overlap]):
+            text += content[overlap:]
+        else:
+            text += "\n" + content
+        previous = node
+    merged = first.model_copy()
+    merged.set_content(text)
+    merged.end_char_idx = previous.end_char_idx if previous.ref_doc_id == first.ref_doc_id else None
+    merged.metadata = dict(first.metadata, merged_chunks=len(run))
+    merged.excluded_llm_metadata_keys = [*first.excluded_llm_metadata_keys, "merged_chunks"]
+    merged.excluded_embed_metadata_keys = [*first.excluded_embed_metadata_keys, "merged_chunks"]
+    return NodeWithScore(node=merged, score=max(n.score for n in run))
+
+
+def pack_context(nodes, budget=CONTEXT_TOKEN_BUDGET):
+    """
+    Elige, en orden de score, los nodos que entran en `budget` tokens de prompt: descarta los
+    duplicados (mismo texto o contenido dentro de otro ya elegido), saltea los que no entran y
+    sigue con los siguientes. Después une los elegidos que son chunks contiguos del mismo archivo.
+    Devuelve los bloques ordenados por score.
+    """
+    selected, seen, used = [], [], 0
+    for n in nodes:
+        text = _normalize(n.node.get_content())
+        if not text or any(text in other for other in seen):
+            continue
+        tokens = count_context_tokens([n])
+        if used + tokens > budget:
+            continue
+        selected.append(n)
+        seen.append(text)
+        used += tokens
+
+    runs = []
+    for n in sorted((n for n in selected if None not in _position(n.node)), key=lambda n: _position(n.node)):
+        file_hash, chunk_index = _position(n.node)
+        if runs and _position(runs[-1][-1].node) == (file_hash, chunk_index - 1):
+            runs[-1].append(n)
+        else:
+            runs.append([n])
+    # Nodos sin posición (ingestados antes de chunk_index) quedan sueltos
+    runs.extend([n] for n in selected if None in _position(n.node))
+    packed = [_merge(run) if len(run) > 1 else run[0] for run in runs]
+    return sorted(packed, key=lambda n: n.score, reverse=True)
@@ -0,0 +1,133 @@
+import json
+import logging
+import re
+from datetime import datetime
+
+from llama_index.core import Settings
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore
+from llama_index.core.vector_stores.utils import metadata_dict_to_node
+from qdrant_client.http.models import (
+    Filter, FieldCondition, MatchAny, Range, HasIdCondition, NamedVector, IsEmptyCondition, PayloadField
+)
+
+from ..vector_store import get_qdrant_client
+from .corpus import scroll_points
+
+# Filtros de payload que acepta /query (las claves vacías se ignoran):
+#   file_names: lista de nombres de archivo
+#   uploaded_from / uploaded_to: rango de fecha de ingesta (epoch, inclusivo)
+#   page_from / page_to: rango de páginas (1..n, inclusivo)
+FILTER_KEYS = ("file_names", "uploaded_from", "uploaded_to", "page_from", "page_to")
+
+# Id de página que asigna la ingesta: "<file_hash>-<índice de página desde 0>"
+PAGE_ID = re.compile(r"^(.+)-(\d+)$")
+
+
+def _range(low, high):
+    if low is None and high is None:
+        return None
+    return Range(gte=low, lte=high)
+
+
+def payload_filter(filters):
+    """Filtro de Qdrant equivalente a `filters`, o None si no hay ninguno."""
+    filters = filters or {}
+    must = []
+    if filters.get("file_names"):
+        must.append(FieldCondition(key="file_name", match=MatchAny(any=list(filters["file_names"]))))
+    uploaded = _range(filters.get("uploaded_from"), filters.get("uploaded_to"))
+    if uploaded is not None:
+        must.append(FieldCondition(key="uploaded_at", range=uploaded))
+    pages = _range(filters.get("page_from"), filters.get("page_to"))
+    if pages is not None:
+        must.append(FieldCondition(key="page_number", range=pages))
+    return Filter(must=must) if must else None
+
+
+def filter_scope(filters):
+    """Representación estable de los filtros para separar entradas del cache de respuestas."""
+    active = {key: filters[key] for key in FILTER_KEYS if filters and filters.get(key) is not None}
+    if "file_names" in active:
+        active["file_names"] = sorted(active["file_names"])
+    return json.dumps(active, sort_keys=True) if active else ""
+
+
+class FilteredQdrantRetriever(BaseRetriever):
+    """
+    Retriever denso que delega en Qdrant el umbral de similitud y los filtros de payload:
+    la búsqueda solo devuelve chunks con score >= `score_threshold` que cumplen el filtro,
+    así al LLM solo llega el contexto que se va a usar. Solo busca en la colección del tenant.
+    Es liviano: se crea uno por consulta con sus filtros.
+    """
+
+    def __init__(self, tenant, top_k, score_threshold=None, filters=None):
+        super().__init__()
+        self.tenant = tenant
+        self.top_k = top_k
+        self.score_threshold = score_threshold
+        self.query_filter = payload_filter(filters)
+
+    def _retrieve(self, query_bundle):
+        embedding = query_bundle.embedding
+        if embedding is None:
+            embedding = Settings.embed_model.get_agg_embedding_from_queries(query_bundle.embedding_strs)
+        vector_store = self.tenant.vector_store()
+        points = vector_store.client.search(
+            collection_name=self.tenant.collection_name,
+            query_vector=NamedVector(name=vector_store.dense_vector_name, vector=embedding),
+            query_filter=self.query_filter,
+            limit=self.top_k,
+            score_threshold=self.score_threshold,
+            with_payload=True
+        )
+        result = vector_store.parse_to_query_result(points)
+        return [NodeWithScore(node=node, score=score) for node, score in zip(result.nodes, result.similarities)]
+
+
+def fetch_nodes(tenant, node_ids, filters=None):
+    """Nodos del tenant con esos ids que además cumplen los filtros (los demás se descartan).
+    Sin filtros es una búsqueda por id; con filtros, un scroll filtrado por id y payload."""
+    if not node_ids:
+        return []
+    query_filter = payload_filter(filters)
+    if query_filter is None:
+        points = get_qdrant_client().retrieve(tenant.collection_name, ids=list(node_ids), with_payload=True)
+    else:
+        query_filter.must.append(HasIdCondition(has_id=list(node_ids)))
+        points = scroll_points(tenant.collection_name, query_filter, page_size=len(node_ids))
+    return [metadata_dict_to_node(point.payload) for point in points]
+
+
+def backfill_filter_payload(tenant):
+    """
+    Agrega page_number y uploaded_at a los puntos del tenant ingestados antes de existir los
+    filtros (se deducen del id de la página y de la fecha de ingesta del manifiesto).
+    El número de página solo se deduce de ids "<file_hash>-<página>"; los ids que generaba
+    LlamaIndex (uuids) quedan sin página. Devuelve los puntos actualizados.
+    """
+    ingested = {entry["file_hash"]: entry.get("ingested_at") for entry in tenant.manifest.entries()}
+    legacy = Filter(must=[IsEmptyCondition(is_empty=PayloadField(key="page_number"))])
+    groups = {}
+    for point in scroll_points(tenant.collection_name, legacy, with_payload=["file_hash", "ref_doc_id", "doc_id"]):
+        payload = point.payload or {}
+        file_hash = payload.get("file_hash")
+        page_id = payload.get("ref_doc_id") or payload.get("doc_id") or ""
+        match = PAGE_ID.match(page_id)
+        page_number = int(match.group(2)) + 1 if match and match.group(1) == file_hash else None
+        if page_number is None and not ingested.get(file_hash):
+            continue
+        groups.setdefault((file_hash, page_number), []).append(point.id)
+
+    qdrant_client = tenant.vector_store().client
+    updated = 0
+    for (file_hash, page_number), point_ids in groups.items():
+        values = {"page_number": page_number} if page_number is not None else {}
+        if ingested.get(file_hash):
+            values["uploaded_at"] = datetime.fromisoformat(ingested[file_hash]).timestamp()
+        try:
+            qdrant_client.set_payload(tenant.collection_name, payload=values, points=point_ids)
+            updated += len(point_ids)
+        except Exception as e:
+            logging.error(f"No se pudo completar el payload de {file_hash}: {str(e)}")
+    return updated
@@ -0,0 +1,132 @@
+import numpy as np
+
+from ..config import CORPUS_SCROLL_PAGE_SIZE, RELATION_SIMILARITY_THRESHOLD, RELATION_CLUSTER_MAX_SIZE
+from .corpus import DISPLAY_FIELD, SOURCE_FIELDS, scroll_points, source_key, source_name
+
+# Cuánto se sube el umbral en cada intento de dividir un cluster que supera el tamaño máximo
+CLUSTER_SPLIT_STEP = 0.02
+
+
+def _point_vector(point):
+    vector = point.vector
+    if isinstance(vector, dict):
+        # Colecciones con vectores con nombre: se usa el vector denso
+        vector = next((v for v in vector.values() if isinstance(v, list)), None)
+    return vector
+
+
+def document_centroids(collection_name, page_size=CORPUS_SCROLL_PAGE_SIZE):
+    """
+    Centroide de cada documento (media de los embeddings de sus chunks ya guardados en Qdrant),
+    calculado en una pasada de scroll: en memoria solo hay una suma por documento.
+    Los documentos se identifican por file_hash (ref_doc_id en puntos antiguos, ver corpus.SOURCE_FIELDS);
+    `source` es solo el nombre para mostrar.
+    Devuelve (lista de documentos {"id", "source", "file_hash", "chunks"}, matriz de centroides).
+    """
+    sums, documents = {}, {}
+    points = scroll_points(collection_name, with_payload=[*SOURCE_FIELDS, DISPLAY_FIELD], with_vectors=True, page_size=page_size)
+    for point in points:
+        payload = point.payload or {}
+        key = source_key(payload)
+        vector = _point_vector(point)
+        if key is None or vector is None:
+            continue
+        if key not in sums:
+            sums[key] = np.zeros(len(vector), dtype=np.float64)
+            documents[key] = {"id": key[1], "source": source_name(payload, key[1]), "file_hash": payload.get("file_hash"), "chunks": 0}
+        sums[key] += vector
+        documents[key]["chunks"] += 1
+
+    if not sums:
+        return [], np.zeros((0, 0))
+    keys = list(sums)
+    centroids = np.stack([sums[key] / documents[key]["chunks"] for key in keys])
+    return [documents[key] for key in keys], centroids
+
+
+def cosine_similarity_matrix(vectors):
+    """Similitud coseno de todos contra todos (vectorizada)."""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    normalized = vectors / np.where(norms == 0, 1, norms)
+    return normalized @ normalized.T
+
+
+def _connected_components(size, edges):
+    """Componentes conexas del grafo (union-find): cada una es un cluster de documentos."""
+    parent = list(range(size))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, j in edges:
+        parent[find(i)] = find(j)
+
+    components = {}
+    for i in range(size):
+        components.setdefault(find(i), []).append(i)
+    return list(components.values())
+
+
+def _split_component(members, similarities, threshold, max_size):
+    """
+    Divide un cluster de más de `max_size` documentos: las componentes conexas encadenan pares
+    similares (A~B, B~C, ...) y a un umbral bajo pueden reunir casi todo el corpus. Dentro del
+    cluster se sube el umbral de a CLUSTER_SPLIT_STEP hasta que cada parte entre en `max_size`;
+    si ni con umbral 1 alcanza (documentos casi idénticos), se corta en grupos de `max_size`.
+    """
+    if len(members) <= max_size:
+        return [members]
+    raised = threshold + CLUSTER_SPLIT_STEP
+    if raised > 1:
+        return [members[i:i + max_size] for i in range(0, len(members), max_size)]
+    inner = similarities[np.ix_(members, members)]
+    rows, cols = np.where(np.triu(inner >= raised, k=1))
+    parts = []
+    for part in _connected_components(len(members), zip(rows.tolist(), cols.tolist())):
+        parts.extend(_split_component([members[i] for i in part], similarities, raised, max_size))
+    return parts
+
+
+def build_similarity_graph(tenant, threshold=RELATION_SIMILARITY_THRESHOLD, max_cluster_size=RELATION_CLUSTER_MAX_SIZE):
+    """
+    Grafo de similitud entre los documentos del tenant a partir de sus centroides: una arista
+    por cada par con similitud coseno >= `threshold` y clusters como componentes conexas,
+    de a lo sumo `max_cluster_size` documentos (ver _split_component). Aristas y clusters
+    referencian a los documentos por su `id` (file_hash).
+    """
+    documents, centroids = document_centroids(tenant.collection_name)
+    if not documents:
+        return {"threshold": threshold, "max_cluster_size": max_cluster_size, "documents": [], "edges": [], "clusters": []}
+
+    similarities = cosine_similarity_matrix(centroids)
+    rows, cols = np.where(np.triu(similarities >= threshold, k=1))
+    edges = [
+        {
+            "source": documents[i]["id"],
+            "target": documents[j]["id"],
+            "similarity": round(float(similarities[i, j]), 4)
+        }
+        for i, j in zip(rows.tolist(), cols.tolist())
+    ]
+    edges.sort(key=lambda edge: edge["similarity"], reverse=True)
+
+    components = []
+    for members in _connected_components(len(documents), zip(rows.tolist(), cols.tolist())):
+        components.extend(_split_component(members, similarities, threshold, max_cluster_size))
+    components.sort(key=len, reverse=True)
+    clusters = []
+    for cluster_id, members in enumerate(components):
+        for i in members:
+            documents[i]["cluster"] = cluster_id
+        clusters.append([documents[i]["id"] for i in members])
+
+    return {
+        "threshold": threshold,
+        "max_cluster_size": max_cluster_size,
+        "documents": documents,
+        "edges": edges,
+        "clusters": clusters
+    }
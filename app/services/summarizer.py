@@ -0,0 +1,110 @@
+from llama_index.core import Settings
+from llama_index.core.node_parser import SentenceSplitter
+
+from ..config import SUMMARY_CHUNK_TOKENS, SUMMARY_MAX_LEVELS
+from ..prompts import SUMMARIZE_PROMPT, SUMMARIZE_SECTION_PROMPT
+from .llm_scheduler import llm_scheduler
+
+SECTION_SEPARATOR = "\n\n"
+
+
+def count_tokens(text):
+    return len(Settings.tokenizer(text))
+
+
+def split_pages(pages, chunk_tokens=SUMMARY_CHUNK_TOKENS):
+    """Divide el texto de las páginas en trozos de como máximo `chunk_tokens` tokens."""
+    splitter = SentenceSplitter(chunk_size=chunk_tokens, chunk_overlap=0)
+    chunks = []
+    for page in pages:
+        text = page.strip()
+        if text:
+            chunks.extend(splitter.split_text(text))
+    return chunks
+
+
+def pack_texts(texts, budget):
+    """Agrupa textos consecutivos (en orden) sin superar `budget` tokens por grupo."""
+    groups, current, used = [], [], 0
+    for text in texts:
+        tokens = count_tokens(text)
+        if current and used + tokens > budget:
+            groups.append(current)
+            current, used = [], 0
+        current.append(text)
+        used += tokens
+    if current:
+        groups.append(current)
+    return [SECTION_SEPARATOR.join(group) for group in groups]
+
+
+def truncate_tokens(text, budget):
+    """Recorta el texto para que no supere `budget` tokens."""
+    tokens = Settings.tokenizer(text)
+    if len(tokens) <= budget:
+        return text
+    # Aproximación por caracteres para no depender de decodificar con el tokenizer
+    return text[: int(len(text) * budget / len(tokens))]
+
+
+def complete(prompt):
+    """Una llamada directa al LLM configurado; devuelve el texto generado."""
+    response = Settings.llm.complete(prompt)
+    return response.text
+
+
+def summarize_texts(documents, chunk_tokens=SUMMARY_CHUNK_TOKENS, max_levels=SUMMARY_MAX_LEVELS):
+    """
+    Resumen jerárquico (map-reduce) directo sobre el texto, sin índice vectorial ni embeddings.
+    `documents` es un dict clave -> lista de trozos de texto (en orden). En cada ronda:
+    si el texto de un documento entra en `chunk_tokens` se hace la llamada final con
+    SUMMARIZE_PROMPT; si no, cada grupo de trozos se resume por separado y los resúmenes
+    parciales pasan a la ronda siguiente. Las llamadas de todos los documentos de una ronda
+    se ejecutan en paralelo a través del planificador del LLM.
+
+    Devuelve clave -> {"summary", "llm_calls", "prompt_tokens", "completion_tokens", "levels"}
+    o la excepción si falló alguna llamada de ese documento.
+    """
+    results = {}
+    pending = {}
+    for key, texts in documents.items():
+        results[key] = {"summary": None, "llm_calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "levels": 0}
+        pending[key] = list(texts)
+
+    while pending:
+        calls = []  # (clave, es la llamada final, prompt)
+        for key, texts in pending.items():
+            results[key]["levels"] += 1
+            groups = pack_texts(texts, chunk_tokens)
+            if len(groups) == 1 or results[key]["levels"] >= max_levels:
+                # Última ronda: si aún no entra, se recorta el texto combinado
+                context = truncate_tokens(SECTION_SEPARATOR.join(groups), chunk_tokens)
+                calls.append((key, True, SUMMARIZE_PROMPT.format(context_str=context)))
+            else:
+                calls.extend((key, False, SUMMARIZE_SECTION_PROMPT.format(context_str=group)) for group in groups)
+
+        prompts = [prompt for _, _, prompt in calls]
+        prompt_tokens = [count_tokens(prompt) for prompt in prompts]
+        # Estimación para el límite de tokens por minuto: prompt + respuesta esperada
+        estimates = [tokens + Settings.num_output for tokens in prompt_tokens]
+        outputs = llm_scheduler.map(complete, prompts, tokens=estimates)
+
+        next_pending = {}
+        for (key, final, _), tokens, output in zip(calls, prompt_tokens, outputs):
+            if isinstance(results[key], Exception):
+                continue
+            if isinstance(output, Exception):
+                results[key] = output
+                next_pending.pop(key, None)
+                continue
+            stats = results[key]
+            stats["llm_calls"] += 1
+            stats["prompt_tokens"] += tokens
+            stats["completion_tokens"] += count_tokens(output)
+            if final:
+                stats["summary"] = output.strip()
+            else:
+                next_pending.setdefault(key, []).append(output.strip())
+        pending = next_pending
+
+    return results
@@ -0,0 +1,55 @@
+import importlib
+import logging
+import sys
+import threading
+import time
+from .models_config import init_models, models_ready
+
+_warm_up = {"status": "pending", "error": None, "seconds": None}
+
+def warm_up():
+    """Importa los servicios, carga los modelos y conecta a Qdrant fuera del arranque de uvicorn."""
+    _warm_up["status"] = "running"
+    start = time.perf_counter()
+    try:
+        init_models()
+        from .config import RERANK_ENABLED
+        if RERANK_ENABLED:
+            from .models_config import get_reranker
+            get_reranker()
+        from .vector_store import init_vector_store
+        init_vector_store()
+        from .config import DEFAULT_TENANT
+        from .tenants import tenant_registry
+        from .services.bm25_index import backfill_bm25_index
+        from .services.retriever import backfill_filter_payload
+        from .models_config import embedding_signature
+        with tenant_registry.lease(DEFAULT_TENANT) as tenant:
+            # Una colección ingestada con otro modelo de embeddings no se sirve: requiere /reset-index
+            tenant.check_embedding(embedding_signature(), record=len(tenant.manifest) > 0)
+            tenant.index()
+            backfill_bm25_index(tenant)
+            backfill_filter_payload(tenant)
+        for module in ("query_service", "pdf_service", "ingest_jobs"):
+            importlib.import_module(f"{__package__}.services.{module}")
+        _warm_up["status"] = "done"
+    except Exception as e:
+        logging.error(f"Error en el warm-up: {str(e)}")
+        _warm_up["status"] = "failed"
+        _warm_up["error"] = str(e)
+    finally:
+        _warm_up["seconds"] = round(time.perf_counter() - start, 3)
+
+def start_warm_up():
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+
+def readiness():
+    """Estado de preparación: modelos cargados y vector store inicializado."""
+    vector_store = sys.modules.get("app.vector_store")
+    vector_store_ready = vector_store is not None and vector_store.index_ready()
+    return {
+        "ready": models_ready() and vector_store_ready and _warm_up["status"] != "running",
+        "models": models_ready(),
+        "vector_store": vector_store_ready,
+        "warm_up": dict(_warm_up),
+    }
@@ -0,0 +1,72 @@
+import json
+import os
+import threading
+from .manifest import write_json_atomic
+
+# Archivos dentro de la carpeta de persistencia de cada tenant
+SUMMARIES_FILE = "summaries.json"
+RELATIONS_FILE = "relations.json"  # análisis de relaciones, con clave derivada del conjunto de documentos
+RELATIONS_RETAINED = 50
+
+
+class SummaryStore:
+    """
+    Resúmenes por documento persistidos junto al manifiesto: hash SHA256 -> resumen,
+    modelo que lo generó y fecha. Como la clave es el hash del contenido, un documento
+    solo se vuelve a resumir si cambia su contenido (o el LLM configurado).
+    """
+
+    def __init__(self, path, max_entries=None):
+        self.path = path
+        self.max_entries = max_entries  # si se indica, se descartan las entradas más antiguas
+        self._lock = threading.RLock()
+        self._entries = {}
+        self.load()
+
+    def load(self):
+        with self._lock:
+            if os.path.exists(self.path):
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self._entries = json.load(f)
+            else:
+                self._entries = {}
+
+    def _save(self):
+        write_json_atomic(self.path, self._entries)
+
+    def __contains__(self, file_hash):
+        return file_hash in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, file_hash, model=None):
+        """Resumen guardado para el hash, o None si no existe o lo generó otro modelo."""
+        entry = self._entries.get(file_hash)
+        if entry is None or (model is not None and entry.get("model") != model):
+            return None
+        return dict(entry)
+
+    def put(self, file_hash, entry):
+        with self._lock:
+            self._entries.pop(file_hash, None)
+            self._entries[file_hash] = entry
+            if self.max_entries:
+                for stale in list(self._entries)[:-self.max_entries]:
+                    del self._entries[stale]
+            self._save()
+
+    def prune(self, keep_hashes):
+        """Elimina los resúmenes de documentos que ya no están en el corpus."""
+        with self._lock:
+            stale = [h for h in self._entries if h not in keep_hashes]
+            for file_hash in stale:
+                del self._entries[file_hash]
+            if stale:
+                self._save()
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+            self._save()
@@ -0,0 +1,263 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from .config import METRICS_ENABLED, TRACING_ENABLED
+
+# Tiempos por etapa (embedding, búsqueda, prompt, LLM, parseo, escritura...) como histogramas
+# en formato Prometheus para /metrics y, opcionalmente, como spans de OpenTelemetry.
+# Sin dependencias: el formato de texto de Prometheus se genera acá.
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+TOKEN_BUCKETS = (16, 64, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250, 500, 1000, 5000)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """Histograma acumulativo con etiquetas (buckets fijos, como el de Prometheus)."""
+
+    def __init__(self, name, documentation, label_names, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series["counts"]):
+                    labels = _format_labels(self.label_names, label_values, f'le="{bound}"')
+                    lines.append(f"{self.name}_bucket{labels} {count}")
+                labels = _format_labels(self.label_names, label_values, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{labels} {series['count']}")
+                labels = _format_labels(self.label_names, label_values)
+                lines.append(f"{self.name}_sum{labels} {series['sum']}")
+                lines.append(f"{self.name}_count{labels} {series['count']}")
+        return "\n".join(lines)
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+STAGE_SECONDS = Histogram(
+    "rag_stage_duration_seconds", "Duración de cada etapa de una operación.",
+    ["operation", "stage"], SECONDS_BUCKETS
+)
+STAGE_TOKENS = Histogram(
+    "rag_stage_tokens", "Tokens de prompt y de respuesta del LLM (y de prompt ahorrados por el rerank) por etapa.",
+    ["operation", "stage", "kind"], TOKEN_BUCKETS
+)
+STAGE_CHUNKS = Histogram(
+    "rag_stage_chunks", "Chunks (o páginas, documentos) procesados por etapa.",
+    ["operation", "stage"], COUNT_BUCKETS
+)
+HISTOGRAMS = [STAGE_SECONDS, STAGE_TOKENS, STAGE_CHUNKS]
+
+
+def render_metrics():
+    """Todas las métricas en el formato de texto de Prometheus (versión 0.0.4)."""
+    return "\n".join(histogram.render() for histogram in HISTOGRAMS) + "\n"
+
+
+class _Span:
+    """Atributos de una etapa en curso: span.set(chunks=10, prompt_tokens=...)."""
+
+    __slots__ = ("attributes",)
+
+    def __init__(self, attributes):
+        self.attributes = attributes
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+
+class _NoopSpan:
+    """Etapa sin medición (métricas y tracing deshabilitados): contexto y atributos vacíos."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+
+_NOOP = _NoopSpan()
+_local = threading.local()
+_tracer = None
+
+
+def _get_tracer():
+    global _tracer
+    if _tracer is None:
+        try:
+            from opentelemetry import trace
+            _tracer = trace.get_tracer("rag-agent")
+        except ImportError:
+            logging.error("TRACING_ENABLED=True pero opentelemetry no está instalado: solo se exportan métricas")
+            _tracer = False
+    return _tracer
+
+
+def _record(operation, stage, seconds, attributes):
+    STAGE_SECONDS.observe(seconds, operation, stage)
+    for kind in ("prompt_tokens", "completion_tokens", "saved_tokens"):
+        if attributes.get(kind):
+            STAGE_TOKENS.observe(attributes[kind], operation, stage, kind.replace("_tokens", ""))
+    if attributes.get("chunks") is not None:
+        STAGE_CHUNKS.observe(attributes["chunks"], operation, stage)
+
+
+def _set_attributes(otel_span, attributes):
+    for key, value in attributes.items():
+        if isinstance(value, (str, bool, int, float)):
+            otel_span.set_attribute(key, value)
+
+
+def observe(operation, stage, seconds, **attributes):
+    """
+    Registra una etapa ya medida que terminó recién: un tramo parseado en el pool de procesos
+    o la síntesis en streaming (el generador puede reanudarse en otro hilo del threadpool,
+    así que no se usa span()). Con tracing se emite un span con los tiempos explícitos.
+    """
+    if METRICS_ENABLED:
+        _record(operation, stage, seconds, attributes)
+    tracer = _get_tracer() if TRACING_ENABLED else None
+    if tracer:
+        end = time.time_ns()
+        otel_span = tracer.start_span(f"{operation}.{stage}", start_time=end - int(seconds * 1e9))
+        _set_attributes(otel_span, attributes)
+        otel_span.end(end_time=end)
+
+
+def span(operation, stage, track_llm=False, **attributes):
+    """
+    Mide una etapa: `with span("query", "retrieve") as s: ...; s.set(chunks=len(nodes))`.
+    Los atributos chunks, prompt_tokens y completion_tokens alimentan los histogramas;
+    todos viajan al span de OpenTelemetry si TRACING_ENABLED.
+
+    Con track_llm=True las llamadas al LLM hechas en este hilo dentro del bloque se miden
+    aparte: se registran las etapas "<stage>.llm" (tiempo del LLM, tokens) y "<stage>.prompt"
+    (el resto: armado del prompt y empaquetado del contexto).
+    Sin métricas ni tracing devuelve un contexto vacío compartido (no mide nada).
+    """
+    if not (METRICS_ENABLED or TRACING_ENABLED):
+        return _NOOP
+    return _measure(operation, stage, track_llm, attributes)
+
+
+@contextmanager
+def _measure(operation, stage, track_llm, attributes):
+    current = _Span(dict(attributes))
+    tracer = _get_tracer() if TRACING_ENABLED else None
+    otel_context = tracer.start_as_current_span(f"{operation}.{stage}") if tracer else None
+    otel_span = otel_context.__enter__() if otel_context else None
+    previous = getattr(_local, "llm", None)
+    llm = {"depth": 0, "start": 0.0, "seconds": 0.0, "calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+    if track_llm:
+        _install_llm_handler()
+        _local.llm = llm
+    start = time.perf_counter()
+    try:
+        yield current
+    finally:
+        elapsed = time.perf_counter() - start
+        if track_llm:
+            _local.llm = previous
+            if llm["calls"]:
+                # Los tokens se registran en la etapa "<stage>.llm"; acá solo viajan al span
+                current.set(llm_calls=llm["calls"], llm_seconds=round(llm["seconds"], 6),
+                            llm_prompt_tokens=llm["prompt_tokens"], llm_completion_tokens=llm["completion_tokens"])
+        if METRICS_ENABLED:
+            _record(operation, stage, elapsed, current.attributes)
+            if track_llm and llm["calls"]:
+                _record(operation, f"{stage}.llm", llm["seconds"], llm)
+                STAGE_SECONDS.observe(max(elapsed - llm["seconds"], 0.0), operation, f"{stage}.prompt")
+        if otel_span is not None:
+            _set_attributes(otel_span, current.attributes)
+            otel_context.__exit__(None, None, None)
+
+
+# Las llamadas al LLM se detectan con los eventos de instrumentación de LlamaIndex (sirve para
+# cualquier proveedor y también en streaming: el evento de fin llega al agotar el generador).
+_handler_installed = False
+_handler_lock = threading.Lock()
+
+
+def _count_tokens(text):
+    from llama_index.core import Settings
+    return len(Settings.tokenizer(text or ""))
+
+
+def _install_llm_handler():
+    global _handler_installed
+    if _handler_installed:
+        return
+    with _handler_lock:
+        if _handler_installed:
+            return
+        from llama_index.core.instrumentation import get_dispatcher
+        from llama_index.core.instrumentation.event_handlers import BaseEventHandler
+        from llama_index.core.instrumentation.events.llm import (
+            LLMChatStartEvent, LLMChatEndEvent, LLMCompletionStartEvent, LLMCompletionEndEvent
+        )
+
+        class LLMTimingHandler(BaseEventHandler):
+            """Acumula tiempo y tokens de las llamadas al LLM en la etapa activa del hilo.
+            Solo cuenta la llamada más externa (complete() de un modelo de chat emite ambos eventos)."""
+
+            def handle(self, event, **kwargs):
+                llm = getattr(_local, "llm", None)
+                if llm is None:
+                    return
+                if isinstance(event, (LLMChatStartEvent, LLMCompletionStartEvent)):
+                    if llm["depth"] == 0:
+                        llm["start"] = time.perf_counter()
+                        prompt = event.prompt if isinstance(event, LLMCompletionStartEvent) else \
+                            "\n".join(str(message.content or "") for message in event.messages)
+                        llm["prompt_tokens"] += _count_tokens(prompt)
+                    llm["depth"] += 1
+                elif isinstance(event, (LLMChatEndEvent, LLMCompletionEndEvent)):
+                    llm["depth"] = max(llm["depth"] - 1, 0)
+                    if llm["depth"] == 0:
+                        llm["seconds"] += time.perf_counter() - llm["start"]
+                        llm["calls"] += 1
+                        response = event.response
+                        text = getattr(response, "text", None)
+                        if text is None and getattr(response, "message", None) is not None:
+                            text = response.message.content
+                        llm["completion_tokens"] += _count_tokens(text)
+
+        get_dispatcher().add_event_handler(LLMTimingHandler())
+        _handler_installed = True
@@ -0,0 +1,205 @@
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+from fastapi import HTTPException
+
+from .config import (
+    COLLECTION_NAME, UPLOAD_DIR, PERSIST_DIR, DEFAULT_TENANT, TENANT_CACHE_SIZE,
+    ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_TTL, ANSWER_CACHE_SIMILARITY
+)
+from .manifest import DocumentManifest, MANIFEST_FILE, write_json_atomic
+from .summary_store import SummaryStore, SUMMARIES_FILE, RELATIONS_FILE, RELATIONS_RETAINED
+from .vector_store import build_vector_store, build_index
+from .services.answer_cache import AnswerCache
+from .services.bm25_index import BM25Index, BM25_FILE
+
+# Cada tenant tiene su propia colección de Qdrant (una búsqueda nunca recorre vectores de otro
+# tenant), su carpeta de PDFs y su carpeta de persistencia (manifiesto, resúmenes, BM25).
+# El tenant por defecto usa COLLECTION_NAME, UPLOAD_DIR y PERSIST_DIR como antes de existir tenants.
+TENANT_ID = re.compile(r"^[a-z0-9][a-z0-9_-]{0,47}$")
+TENANTS_DIR = "tenants"
+# Modelo de embeddings con el que se ingestó la colección (proveedor, modelo, pooling):
+# dos modelos con la misma dimensión no son intercambiables, así que se compara al arrancar y al usar.
+EMBEDDING_FILE = "embedding.json"
+
+
+def check_tenant_id(tenant_id):
+    if not TENANT_ID.match(tenant_id or ""):
+        raise HTTPException(
+            status_code=400,
+            detail="Tenant inválido: usar minúsculas, dígitos, '-' o '_' (hasta 48 caracteres)."
+        )
+    return tenant_id
+
+
+class Tenant:
+    """
+    Estado de un tenant: nombre de su colección, carpetas, manifiesto, resúmenes, índice BM25
+    y cache de respuestas. El vector store y el VectorStoreIndex se crean al primer uso.
+    Los objetos los cachea TenantRegistry; no crear instancias fuera del registro (dos
+    instancias del mismo tenant escribirían el mismo manifiesto).
+    """
+
+    def __init__(self, tenant_id):
+        self.id = tenant_id
+        if tenant_id == DEFAULT_TENANT:
+            self.collection_name = COLLECTION_NAME
+            self.upload_dir = UPLOAD_DIR
+            self.persist_dir = PERSIST_DIR
+        else:
+            self.collection_name = f"{COLLECTION_NAME}__{tenant_id}"
+            self.upload_dir = os.path.join(UPLOAD_DIR, TENANTS_DIR, tenant_id)
+            self.persist_dir = os.path.join(PERSIST_DIR, TENANTS_DIR, tenant_id)
+        os.makedirs(self.upload_dir, exist_ok=True)
+        os.makedirs(self.persist_dir, exist_ok=True)
+
+        self.manifest = DocumentManifest(os.path.join(self.persist_dir, MANIFEST_FILE), self.upload_dir)
+        self.summary_store = SummaryStore(os.path.join(self.persist_dir, SUMMARIES_FILE))
+        self.relation_store = SummaryStore(os.path.join(self.persist_dir, RELATIONS_FILE), max_entries=RELATIONS_RETAINED)
+        self.bm25_index = BM25Index(os.path.join(self.persist_dir, BM25_FILE))
+        self.answer_cache = AnswerCache(ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_TTL, ANSWER_CACHE_SIMILARITY)
+        self.embedding_path = os.path.join(self.persist_dir, EMBEDDING_FILE)
+        self.leases = 0
+        self._vector_store = None
+        self._index = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_default(self):
+        return self.id == DEFAULT_TENANT
+
+    def vector_store(self):
+        """QdrantVectorStore sobre la colección del tenant (la crea si no existe)."""
+        if self._vector_store is None:
+            with self._lock:
+                if self._vector_store is None:
+                    self._vector_store = build_vector_store(self.collection_name)
+        return self._vector_store
+
+    def index(self):
+        """VectorStoreIndex sobre la colección del tenant."""
+        if self._index is None:
+            vector_store = self.vector_store()
+            with self._lock:
+                if self._index is None:
+                    self._index = build_index(vector_store)
+        return self._index
+
+    def check_embedding(self, signature, record=False):
+        """Compara `signature` con el modelo registrado para la colección y falla (409) si difiere:
+        los vectores existentes no son comparables con los del modelo actual. Sin registro previo
+        y con `record=True` (ingesta, o arranque con documentos ya ingestados) se registra `signature`."""
+        with self._lock:
+            recorded = None
+            if os.path.exists(self.embedding_path):
+                with open(self.embedding_path, "r", encoding="utf-8") as f:
+                    recorded = json.load(f)
+            if recorded is None:
+                if record:
+                    write_json_atomic(self.embedding_path, signature)
+                return
+        if recorded != signature:
+            raise HTTPException(
+                status_code=409,
+                detail=(
+                    f"La colección del tenant '{self.id}' se ingestó con {recorded} pero el modelo "
+                    f"configurado es {signature}: usa /reset-index y re-ingesta, o restaura el modelo."
+                )
+            )
+
+    def close(self):
+        self.bm25_index.close()
+
+
+class TenantRegistry:
+    """
+    Tenants cargados en memoria con desalojo LRU: como máximo `max_tenants` (TENANT_CACHE_SIZE)
+    quedan cacheados; al superarlo se descarta el usado hace más tiempo que no tenga requests ni
+    jobs en curso (un tenant en uso nunca se desaloja, así no hay dos instancias del mismo tenant).
+    Un tenant desalojado se vuelve a cargar desde disco y Qdrant en su próximo request.
+    La carga (manifiesto, BM25, colección) se hace fuera del lock del registro: un tenant en frío
+    no demora los requests de los demás; los requests concurrentes del mismo tenant esperan a esa
+    única carga.
+    """
+
+    def __init__(self, max_tenants=TENANT_CACHE_SIZE):
+        self.max_tenants = max_tenants
+        self._tenants = OrderedDict()
+        self._loading = {}  # tenant_id -> Future de la carga en curso
+        self._lock = threading.Lock()
+        self._counters = {"loads": 0, "hits": 0, "evictions": 0}
+
+    def acquire(self, tenant_id):
+        """Devuelve el tenant marcándolo en uso hasta `release`."""
+        check_tenant_id(tenant_id)
+        while True:
+            with self._lock:
+                tenant = self._tenants.get(tenant_id)
+                if tenant is not None:
+                    self._tenants.move_to_end(tenant_id)
+                    self._counters["hits"] += 1
+                    tenant.leases += 1
+                    self._evict()
+                    return tenant
+                loading = self._loading.get(tenant_id)
+                if loading is None:
+                    loading = self._loading[tenant_id] = Future()
+                    break
+            # Otro request está cargando el tenant: se espera y se vuelve a buscar en el registro
+            loading.result()
+
+        try:
+            tenant = Tenant(tenant_id)
+        except Exception as e:
+            with self._lock:
+                self._loading.pop(tenant_id)
+            loading.set_exception(e)
+            raise
+        with self._lock:
+            self._loading.pop(tenant_id)
+            self._tenants[tenant_id] = tenant
+            self._counters["loads"] += 1
+            tenant.leases += 1
+            self._evict()
+        loading.set_result(tenant)
+        return tenant
+
+    def release(self, tenant):
+        with self._lock:
+            tenant.leases -= 1
+            self._evict()
+
+    @contextmanager
+    def lease(self, tenant_id):
+        tenant = self.acquire(tenant_id)
+        try:
+            yield tenant
+        finally:
+            self.release(tenant)
+
+    def _evict(self):
+        idle = [tenant_id for tenant_id, tenant in self._tenants.items() if tenant.leases == 0]
+        for tenant_id in idle[:max(0, len(self._tenants) - self.max_tenants)]:
+            tenant = self._tenants.pop(tenant_id)
+            try:
+                tenant.close()
+            except Exception as e:
+                logging.error(f"Error cerrando el tenant '{tenant_id}': {str(e)}")
+            self._counters["evictions"] += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "loaded": list(self._tenants),
+                "max_tenants": self.max_tenants,
+                **self._counters,
+            }
+
+
+tenant_registry = TenantRegistry()
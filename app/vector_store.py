@@ -1,23 +1,131 @@
+import logging
+import threading
 from qdrant_client import QdrantClient
-from qdrant_client.http.models import Distance, VectorParams
+from qdrant_client.http.models import Distance, VectorParams, PayloadSchemaType
+from llama_index.core import StorageContext, VectorStoreIndex
 from llama_index.vector_stores.qdrant import QdrantVectorStore
-from .config import COLLECTION_NAME, QDRANT_HOST, QDRANT_PORT
+from .config import (
+    EMBEDDING_DIM, COLLECTION_NAME, USE_QDRANT, QDRANT_HOST, QDRANT_PORT, QDRANT_GRPC_PORT, QDRANT_PREFER_GRPC,
+    QDRANT_LOCAL_PATH
+)
+
+# Un único cliente por proceso, compartido por todos los tenants: se evita abrir conexiones
+# en cada request. El vector store y el índice de cada colección (una por tenant) los
+# cachea el registro de tenants (ver tenants.py).
+_client = None
+_ready = False
+_lock = threading.RLock()
+
+# Campos del payload por los que /query puede filtrar: con índice, Qdrant filtra antes
+# de puntuar en vez de recorrer los candidatos.
+PAYLOAD_INDEXES = {
+    "file_name": PayloadSchemaType.KEYWORD,
+    "file_hash": PayloadSchemaType.KEYWORD,
+    "page_number": PayloadSchemaType.INTEGER,
+    "uploaded_at": PayloadSchemaType.FLOAT,
+}
+
+# Hasta cuántos chunks el modo embebido responde a latencia interactiva: busca recorriendo
+# todos los vectores (~45 ms cada 10k en un core) y carga la colección entera al abrirla
+LOCAL_INTERACTIVE_POINTS = 10_000
 
 def get_qdrant_client():
-    return QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT)
+    """Cliente de Qdrant: el servidor configurado o, con USE_QDRANT=False, Qdrant embebido
+    persistido en QDRANT_LOCAL_PATH (misma API; un solo proceso puede abrir la carpeta).
+    El modo embebido es para corpus chicos: ver LOCAL_INTERACTIVE_POINTS."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                if USE_QDRANT:
+                    _client = QdrantClient(
+                        host=QDRANT_HOST,
+                        port=QDRANT_PORT,
+                        grpc_port=QDRANT_GRPC_PORT,
+                        prefer_grpc=QDRANT_PREFER_GRPC
+                    )
+                else:
+                    _client = QdrantClient(path=QDRANT_LOCAL_PATH)
+    return _client
 
-def get_qdrant_collection():
-    qdrant_client = get_qdrant_client()
-    return qdrant_client.get_collection(COLLECTION_NAME)
+def get_qdrant_collection(collection_name):
+    return get_qdrant_client().get_collection(collection_name)
 
-def get_vector_store():
-    qdrant_client = get_qdrant_client()
-    # qdrant_client.get_collections()
+def _ensure_collection(qdrant_client, collection_name):
+    if not qdrant_client.collection_exists(collection_name):
+        qdrant_client.create_collection(
+            collection_name=collection_name,
+            vectors_config=VectorParams(size=EMBEDDING_DIM, distance=Distance.COSINE)
+        )
+    else:
+        _check_vector_size(qdrant_client, collection_name)
+    _ensure_payload_indexes(qdrant_client, collection_name)
 
-    if not qdrant_client.collection_exists(COLLECTION_NAME):
-        qdrant_client.recreate_collection(
-            collection_name=COLLECTION_NAME,
-            vectors_config=VectorParams(size=768, distance=Distance.COSINE)
+def _check_vector_size(qdrant_client, collection_name):
+    """Una colección existente con otra dimensión no sirve para el modelo configurado."""
+    vectors = qdrant_client.get_collection(collection_name).config.params.vectors
+    size = vectors.size if hasattr(vectors, "size") else None
+    if size is not None and size != EMBEDDING_DIM:
+        raise ValueError(
+            f"La colección '{collection_name}' tiene vectores de {size} dimensiones "
+            f"pero EMBEDDING_DIM={EMBEDDING_DIM}: usa /reset-index y re-ingesta los documentos, o ajusta el modelo"
         )
 
-    return QdrantVectorStore(client=qdrant_client, collection_name=COLLECTION_NAME)
+def _ensure_payload_indexes(qdrant_client, collection_name):
+    """Crea los índices de payload que falten (también en colecciones ya existentes).
+    El modo embebido no usa índices de payload: filtra recorriendo los puntos."""
+    if not USE_QDRANT:
+        return
+    existing = qdrant_client.get_collection(collection_name).payload_schema or {}
+    for field, schema in PAYLOAD_INDEXES.items():
+        if field not in existing:
+            try:
+                qdrant_client.create_payload_index(collection_name, field_name=field, field_schema=schema)
+            except Exception as e:
+                logging.error(f"No se pudo crear el índice de payload '{field}' en '{collection_name}': {str(e)}")
+
+def build_vector_store(collection_name):
+    """Vector store sobre la colección (se crea si no existe). Lo cachea el tenant dueño de la colección."""
+    global _ready
+    qdrant_client = get_qdrant_client()
+    with _lock:
+        _ensure_collection(qdrant_client, collection_name)
+    _ready = True
+    return QdrantVectorStore(client=qdrant_client, collection_name=collection_name)
+
+def build_index(vector_store):
+    """VectorStoreIndex sobre un vector store ya construido."""
+    storage_context = StorageContext.from_defaults(vector_store=vector_store)
+    return VectorStoreIndex.from_vector_store(vector_store=vector_store, storage_context=storage_context)
+
+def index_ready():
+    return _ready
+
+def init_vector_store():
+    """Bootstrap al iniciar la app: conecta y verifica la colección del tenant por defecto una sola vez.
+    Si Qdrant aún no está disponible se reintenta en el primer request; una colección con
+    otra dimensión de vectores, en cambio, hace fallar el arranque."""
+    global _ready
+    try:
+        qdrant_client = get_qdrant_client()
+        with _lock:
+            _ensure_collection(qdrant_client, COLLECTION_NAME)
+        if not USE_QDRANT:
+            points = qdrant_client.count(COLLECTION_NAME).count
+            if points > LOCAL_INTERACTIVE_POINTS:
+                logging.warning(
+                    f"Qdrant embebido con {points} chunks en '{COLLECTION_NAME}': cada búsqueda recorre "
+                    f"todos los vectores, por encima de {LOCAL_INTERACTIVE_POINTS} conviene USE_QDRANT=True"
+                )
+        _ready = True
+    except ValueError:
+        raise
+    except Exception as e:
+        logging.error(f"No se pudo inicializar Qdrant al arrancar: {str(e)}")
+
+def reset_collection(collection_name):
+    """Elimina la colección y la vuelve a crear vacía; los vector stores cacheados siguen siendo válidos."""
+    with _lock:
+        qdrant_client = get_qdrant_client()
+        qdrant_client.delete_collection(collection_name=collection_name)
+        _ensure_collection(qdrant_client, collection_name)
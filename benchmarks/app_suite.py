@@ -0,0 +1,471 @@
+"""
+Benchmark de punta a punta de la API con reemplazos locales: corpus de PDFs sintéticos,
+Qdrant embebido (USE_QDRANT=False en una carpeta temporal), un LLM falso determinista y un
+modelo de embeddings chico. Para cada tamaño de corpus mide:
+
+- upload: throughput de /upload-pdf/ (documentos, páginas y chunks por segundo).
+- query: latencia p50/p95/p99 de /query con N requests concurrentes, por modo de recuperación,
+  con los chunks promedio por respuesta y la fracción de consultas que llegaron al LLM.
+- summarize: tiempo de /summarize-docs en frío y con los resúmenes ya guardados.
+- memoria: pico de RSS del proceso (y de los workers de parseo) en cada fase.
+
+Uso:
+    python -m benchmarks.app_suite --docs 10,50,200 --pages 8 \
+        --embedding fastembed:BAAI/bge-small-en-v1.5 --embedding-dim 384 \
+        --output bench_app.json --baseline bench_app_prev.json
+
+`--embedding hash` usa embeddings por hashing de palabras (sin descargar modelos).
+El JSON incluye el commit y la configuración; con --baseline se imprimen los cocientes
+(actual / anterior) de las métricas principales para detectar regresiones entre commits.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+TOPICS = ["contrato", "factura", "manual", "informe", "política", "auditoría", "proyecto", "producto"]
+WORDS = [
+    "cliente", "pago", "plazo", "servicio", "riesgo", "versión", "entrega", "garantía",
+    "soporte", "multa", "proveedor", "alcance", "calidad", "auditor", "inventario", "licencia",
+]
+
+
+def make_pdf(pages):
+    """PDF mínimo (Helvetica, una línea de texto por renglón) con una página por string."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(len(pages)))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>")
+    font_id = 3 + 2 * len(pages)
+    for i, text in enumerate(pages):
+        ops = ["BT", "/F1 9 Tf", "12 TL", "40 800 Td"]
+        for line in text.split("\n"):
+            line = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            ops.append(f"({line}) Tj T*")
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1", "replace")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] /Contents {4 + 2 * i} 0 R "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> >>"
+        )
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream.decode('latin-1')}\nendstream")
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1", "replace")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+def synthetic_corpus(docs, pages, seed=0):
+    """
+    `docs` PDFs de `pages` páginas con títulos, párrafos y una tabla por página.
+    Cada documento tiene un código propio (CT-<año>-<n>) que sirve de consulta exacta.
+    Devuelve [(nombre, bytes del PDF, código)].
+    """
+    rng = random.Random(seed)
+    corpus = []
+    for d in range(docs):
+        topic = rng.choice(TOPICS)
+        code = f"CT-{2020 + d % 5}-{d:05d}"
+        page_texts = []
+        for p in range(pages):
+            lines = [f"{p + 1}. {topic.upper()} {code} SECCION {p + 1}"]
+            for _ in range(3):
+                sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(60, 90)))
+                lines.extend(sentence[i:i + 95] for i in range(0, len(sentence), 95))
+                lines.append("")
+            lines.append("Item  |  Cantidad  |  Precio")
+            lines.extend(f"{rng.choice(WORDS)}  |  {rng.randint(1, 50)}  |  {rng.randint(10, 9999)}" for _ in range(5))
+            page_texts.append("\n".join(lines))
+        corpus.append((f"{topic}_{d:05d}.pdf", make_pdf(page_texts), code))
+    return corpus
+
+
+def make_queries(corpus, count, seed=0):
+    """Mezcla de consultas por código exacto y por frases del vocabulario."""
+    rng = random.Random(seed)
+    queries = []
+    for i in range(count):
+        if i % 2 == 0:
+            queries.append(f"¿Qué dice el {rng.choice(TOPICS)} {rng.choice(corpus)[2]}?")
+        else:
+            queries.append(" ".join(rng.choice(WORDS) for _ in range(8)))
+    return queries
+
+
+def _rss_mb(pid="self"):
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        return 0.0
+
+
+def _children():
+    pids = []
+    try:
+        for task in os.listdir("/proc/self/task"):
+            with open(f"/proc/self/task/{task}/children") as f:
+                pids.extend(f.read().split())
+    except OSError:
+        pass
+    return pids
+
+
+class MemorySampler:
+    """Pico de RSS (proceso principal y suma de sus hijos) mientras dura el bloque `with`.
+    Lee /proc cada `interval` segundos; fuera de Linux informa el ru_maxrss del proceso."""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak_mb = 0.0
+        self.peak_children_mb = 0.0
+        self._stop = threading.Event()
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak_mb = max(self.peak_mb, _rss_mb())
+            self.peak_children_mb = max(self.peak_children_mb, sum(_rss_mb(pid) for pid in _children()))
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        if self.peak_mb == 0.0:
+            import resource
+            self.peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    def result(self):
+        return {"peak_rss_mb": round(self.peak_mb, 1), "peak_children_rss_mb": round(self.peak_children_mb, 1)}
+
+
+def build_fake_llm(latency_ms, answer_tokens):
+    """LLM determinista: la respuesta depende solo del prompt y tarda `latency_ms`."""
+    from llama_index.core.llms import CustomLLM, CompletionResponse, LLMMetadata
+    from llama_index.core.llms.callbacks import llm_completion_callback
+
+    class FakeLLM(CustomLLM):
+        latency_ms: float = 0.0
+        answer_tokens: int = 64
+
+        @property
+        def metadata(self):
+            return LLMMetadata(context_window=8192, num_output=self.answer_tokens, model_name="fake")
+
+        def _answer(self, prompt):
+            rng = random.Random(hashlib.sha256(prompt.encode("utf-8")).hexdigest())
+            return " ".join(rng.choice(WORDS) for _ in range(self.answer_tokens))
+
+        @llm_completion_callback()
+        def complete(self, prompt, formatted=False, **kwargs):
+            time.sleep(self.latency_ms / 1000)
+            return CompletionResponse(text=self._answer(prompt))
+
+        @llm_completion_callback()
+        def stream_complete(self, prompt, formatted=False, **kwargs):
+            time.sleep(self.latency_ms / 1000)
+            text = ""
+            for word in self._answer(prompt).split():
+                text += word + " "
+                yield CompletionResponse(text=text, delta=word + " ")
+
+    return FakeLLM(latency_ms=latency_ms, answer_tokens=answer_tokens)
+
+
+def build_hash_embedding(dim):
+    """Embeddings por hashing de palabras: deterministas y sin modelo que descargar."""
+    from llama_index.core.embeddings import BaseEmbedding
+
+    class HashEmbedding(BaseEmbedding):
+        dim: int = 384
+
+        def _vector(self, text):
+            vector = np.zeros(self.dim, dtype=np.float32)
+            for word in text.lower().split():
+                vector[int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16) % self.dim] += 1
+            return (vector / max(np.linalg.norm(vector), 1e-12)).tolist()
+
+        def _get_query_embedding(self, query):
+            return self._vector(query)
+
+        async def _aget_query_embedding(self, query):
+            return self._vector(query)
+
+        def _get_text_embedding(self, text):
+            return self._vector(text)
+
+    return HashEmbedding(dim=dim)
+
+
+def configure_environment(args, workdir):
+    """Variables de entorno de la app antes de importarla: Qdrant embebido en `workdir`,
+    sin cache de respuestas (cada consulta recorre el pipeline) y sin límite de cuota del LLM."""
+    provider, _, model_name = args.embedding.partition(":")
+    os.environ.update({
+        "USE_QDRANT": "False",
+        "QDRANT_LOCAL_PATH": os.path.join(workdir, "storage", "qdrant_local"),
+        "WARMUP_ON_STARTUP": "False",
+        "ANSWER_CACHE_ENABLED": "False",
+        "EMBED_CACHE_ENABLED": "False",
+        "LLM_REQUESTS_PER_MINUTE": "0",
+        "LLM_TOKENS_PER_MINUTE": "0",
+        "EMBEDDING_DIM": str(args.embedding_dim),
+        "COLLECTION_NAME": "benchmark",
+    })
+    if provider != "hash":
+        os.environ["EMBEDDING_PROVIDER"] = provider
+        os.environ["EMBEDDING_MODEL"] = model_name
+    # PERSIST_DIR y UPLOAD_DIR son relativos al directorio de trabajo
+    os.chdir(workdir)
+
+
+def install_models(args):
+    from app import models_config
+
+    llm = build_fake_llm(args.llm_latency_ms, args.answer_tokens)
+    models_config.build_llm = lambda: llm
+    if args.embedding.startswith("hash"):
+        embed_model = build_hash_embedding(args.embedding_dim)
+        models_config.build_embed_model = lambda **kwargs: embed_model
+    models_config.init_models()
+
+
+def percentiles(values):
+    return {
+        "p50_ms": round(float(np.percentile(values, 50)), 2),
+        "p95_ms": round(float(np.percentile(values, 95)), 2),
+        "p99_ms": round(float(np.percentile(values, 99)), 2),
+        "mean_ms": round(statistics.mean(values), 2),
+    }
+
+
+async def bench_upload(client, corpus, batch_size):
+    start = time.perf_counter()
+    for i in range(0, len(corpus), batch_size):
+        files = [("files", (name, data, "application/pdf")) for name, data, _ in corpus[i:i + batch_size]]
+        response = await client.post("/upload-pdf/", files=files)
+        response.raise_for_status()
+    return time.perf_counter() - start
+
+
+async def bench_queries(client, queries, mode, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, sources, errors = [], [], 0
+
+    async def one(question):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.get("/query", params={"q": question, "mode": mode})
+            latencies.append((time.perf_counter() - start) * 1000)
+            errors += response.status_code != 200
+            if response.status_code == 200:
+                sources.append(len(response.json()["response"]["sources"]))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(question) for question in queries))
+    wall = time.perf_counter() - start
+    return {
+        "requests": len(queries),
+        "concurrency": concurrency,
+        "errors": errors,
+        "requests_per_second": round(len(queries) / wall, 2),
+        # Sin chunks sobre el umbral no se llama al LLM: comparar latencias entre modos con esto a la vista
+        "mean_sources": round(statistics.mean(sources), 2) if sources else 0,
+        "answered_with_llm": round(sum(count > 0 for count in sources) / len(sources), 3) if sources else 0,
+        **percentiles(latencies),
+    }
+
+
+async def warm_up(app):
+    """Una ingesta y una consulta descartables: arranca el pool de parseo (spawn) y carga
+    los modelos antes de medir, así el primer tamaño de corpus no paga ese costo."""
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        await bench_upload(client, synthetic_corpus(1, 1, seed=-1), 1)
+        await client.get("/query", params={"q": "warm-up"})
+        (await client.delete("/reset-index")).raise_for_status()
+
+
+async def bench_size(app, docs, args):
+    import httpx
+    from app.config import DEFAULT_TENANT
+    from app.tenants import tenant_registry
+
+    corpus = synthetic_corpus(docs, args.pages, seed=docs)
+    queries = make_queries(corpus, args.queries, seed=docs)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        (await client.delete("/reset-index")).raise_for_status()
+        result = {"docs": docs, "pages": docs * args.pages}
+
+        with MemorySampler() as memory:
+            seconds = await bench_upload(client, corpus, args.upload_batch)
+        with tenant_registry.lease(DEFAULT_TENANT) as tenant:
+            chunks = sum(len(entry["node_ids"]) for entry in tenant.manifest.entries())
+        result["chunks"] = chunks
+        result["upload"] = {
+            "seconds": round(seconds, 3),
+            "docs_per_second": round(docs / seconds, 2),
+            "pages_per_second": round(docs * args.pages / seconds, 2),
+            "chunks_per_second": round(chunks / seconds, 2),
+            **memory.result(),
+        }
+
+        result["query"] = {}
+        for mode in args.modes:
+            await client.get("/query", params={"q": queries[0], "mode": mode})  # warm-up
+            with MemorySampler() as memory:
+                stats = await bench_queries(client, queries, mode, args.concurrency)
+            result["query"][mode] = {**stats, **memory.result()}
+
+        result["summarize"] = {}
+        for phase in ("cold", "stored"):
+            with MemorySampler() as memory:
+                start = time.perf_counter()
+                response = await client.get("/summarize-docs")
+                seconds = time.perf_counter() - start
+            response.raise_for_status()
+            result["summarize"][phase] = {"seconds": round(seconds, 3), **memory.result()}
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Métricas que se comparan contra --baseline: (ruta en el resultado, mayor es mejor)
+TRACKED = [
+    (("upload", "pages_per_second"), True),
+    (("upload", "peak_rss_mb"), False),
+    (("query", "{mode}", "p50_ms"), False),
+    (("query", "{mode}", "p95_ms"), False),
+    (("query", "{mode}", "p99_ms"), False),
+    (("summarize", "cold", "seconds"), False),
+    (("summarize", "cold", "peak_rss_mb"), False),
+]
+
+
+def _lookup(data, path):
+    for key in path:
+        if not isinstance(data, dict) or key not in data:
+            return None
+        data = data[key]
+    return data
+
+
+def compare(results, baseline):
+    """Cociente actual / anterior por tamaño de corpus; marca las regresiones de más de 10%."""
+    previous = {entry["docs"]: entry for entry in baseline.get("results", [])}
+    report = []
+    for entry in results:
+        old = previous.get(entry["docs"])
+        if old is None:
+            continue
+        for path, higher_is_better in TRACKED:
+            paths = [tuple(mode if key == "{mode}" else key for key in path) for mode in entry["query"]] \
+                if "{mode}" in path else [path]
+            for concrete in paths:
+                now, before = _lookup(entry, concrete), _lookup(old, concrete)
+                if not now or not before:
+                    continue
+                ratio = now / before
+                regression = ratio < 0.9 if higher_is_better else ratio > 1.1
+                report.append({
+                    "docs": entry["docs"], "metric": ".".join(concrete),
+                    "baseline": before, "current": now, "ratio": round(ratio, 3), "regression": regression,
+                })
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", default="5,20,50", help="tamaños de corpus (documentos), separados por coma")
+    parser.add_argument("--pages", type=int, default=8, help="páginas por documento")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--modes", default="dense,hybrid")
+    parser.add_argument("--upload-batch", type=int, default=5, help="PDFs por request de /upload-pdf/")
+    parser.add_argument("--embedding", default="fastembed:BAAI/bge-small-en-v1.5", help="proveedor:modelo o 'hash'")
+    parser.add_argument("--embedding-dim", type=int, default=384)
+    parser.add_argument("--llm-latency-ms", type=float, default=50.0, help="latencia simulada por llamada al LLM")
+    parser.add_argument("--answer-tokens", type=int, default=64)
+    parser.add_argument("--workdir", default=None, help="carpeta de trabajo (por defecto una temporal)")
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--baseline", default=None, help="JSON de una corrida anterior para comparar")
+    args = parser.parse_args()
+    args.modes = args.modes.split(",")
+    for name in ("output", "baseline"):
+        if getattr(args, name):
+            setattr(args, name, os.path.abspath(getattr(args, name)))
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="rag-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    configure_environment(args, workdir)
+    install_models(args)
+
+    from app.main import app
+    from app.vector_store import init_vector_store
+    init_vector_store()
+
+    asyncio.run(warm_up(app))
+    results = []
+    for docs in (int(size) for size in args.docs.split(",")):
+        result = asyncio.run(bench_size(app, docs, args))
+        results.append(result)
+        print(json.dumps(result, ensure_ascii=False))
+
+    output = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline", "workdir")},
+        "results": results,
+    }
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            output["comparison"] = compare(results, json.load(f))
+        for row in output["comparison"]:
+            flag = "REGRESIÓN" if row["regression"] else "ok"
+            print(f"{row['docs']:>6} docs  {row['metric']:<32} {row['baseline']:>10} -> {row['current']:>10}  x{row['ratio']}  {flag}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(output, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Comparación de backends de embeddings en CPU: throughput de ingesta, latencia de
+query y recall de recuperación.
+
+Uso:
+    python -m benchmarks.embedding_backends \
+        --backend huggingface:hkunlp/instructor-base \
+        --backend onnx:BAAI/bge-base-en-v1.5 \
+        --backend onnx-int8:BAAI/bge-base-en-v1.5 \
+        --backend fastembed:BAAI/bge-base-en-v1.5 \
+        --pdf-dir uploads --output bench_embeddings.json
+
+El primer backend es la referencia: además del recall propio (cada query es una
+frase tomada de un chunk y debe recuperar ese chunk) se reporta cuánto del top-k
+de la referencia recupera cada backend.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import time
+
+import numpy as np
+
+
+def load_chunks(pdf_dir, limit):
+    """Chunks reales desde los PDFs de `pdf_dir`, o un corpus sintético si no se indica."""
+    if pdf_dir:
+        from app.services.pdf_parser import parse_pdf
+
+        chunks = []
+        for filename in sorted(os.listdir(pdf_dir)):
+            if filename.lower().endswith(".pdf"):
+                _, nodes = parse_pdf(os.path.abspath(os.path.join(pdf_dir, filename)), filename)
+                chunks.extend(node.get_content() for node in nodes)
+        return chunks[:limit]
+
+    rng = random.Random(0)
+    topics = ["contrato", "factura", "manual", "informe", "política", "auditoría", "proyecto", "producto"]
+    words = ["cliente", "pago", "plazo", "servicio", "riesgo", "código", "versión", "entrega", "garantía", "soporte"]
+    return [
+        f"{rng.choice(topics).capitalize()} número {i}. "
+        + " ".join(rng.choice(words) for _ in range(120))
+        for i in range(limit)
+    ]
+
+
+def make_queries(chunks, count, seed=0):
+    rng = random.Random(seed)
+    picked = rng.sample(range(len(chunks)), min(count, len(chunks)))
+    queries = []
+    for i in picked:
+        words = chunks[i].split()
+        start = rng.randrange(max(1, len(words) - 12))
+        queries.append((" ".join(words[start:start + 12]), i))
+    return queries
+
+
+def build_backend(spec, threads):
+    provider, model_name = spec.split(":", 1)
+    os.environ["EMBEDDING_THREADS"] = str(threads)
+    if provider == "onnx-int8":
+        from app.onnx_embedding import OnnxEmbedding
+        from app.config import CACHE_DIR
+        return OnnxEmbedding(model_name=model_name, cache_dir=os.path.join(CACHE_DIR, "onnx"), quantize=True, threads=threads)
+    from app.models_config import build_embed_model
+    return build_embed_model(provider=provider, model_name=model_name)
+
+
+def run_backend(spec, chunks, queries, top_k, threads):
+    model = build_backend(spec, threads)
+    model.get_text_embedding_batch(chunks[:8])  # warm-up
+
+    start = time.perf_counter()
+    doc_vectors = np.asarray(model.get_text_embedding_batch(chunks), dtype=np.float32)
+    ingest_seconds = time.perf_counter() - start
+    doc_vectors /= np.clip(np.linalg.norm(doc_vectors, axis=1, keepdims=True), 1e-12, None)
+
+    latencies, rankings = [], []
+    for text, _ in queries:
+        start = time.perf_counter()
+        vector = np.asarray(model.get_query_embedding(text), dtype=np.float32)
+        latencies.append((time.perf_counter() - start) * 1000)
+        scores = doc_vectors @ (vector / max(np.linalg.norm(vector), 1e-12))
+        rankings.append(np.argsort(-scores)[:top_k].tolist())
+
+    hits = sum(1 for (_, target), ranking in zip(queries, rankings) if target in ranking)
+    return {
+        "backend": spec,
+        "dimension": int(doc_vectors.shape[1]),
+        "chunks": len(chunks),
+        "ingest_seconds": round(ingest_seconds, 3),
+        "chunks_per_second": round(len(chunks) / ingest_seconds, 1),
+        "query_latency_ms_p50": round(statistics.median(latencies), 2),
+        "query_latency_ms_p95": round(float(np.percentile(latencies, 95)), 2),
+        f"self_recall_at_{top_k}": round(hits / len(queries), 4),
+    }, rankings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", action="append", required=True, help="proveedor:modelo (proveedores: huggingface, openai, fastembed, onnx, onnx-int8)")
+    parser.add_argument("--pdf-dir", default=None)
+    parser.add_argument("--chunks", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    chunks = load_chunks(args.pdf_dir, args.chunks)
+    queries = make_queries(chunks, args.queries)
+
+    results, reference = [], None
+    for spec in args.backend:
+        result, rankings = run_backend(spec, chunks, queries, args.top_k, args.threads)
+        if reference is None:
+            reference = rankings
+        else:
+            overlap = [len(set(a) & set(b)) / args.top_k for a, b in zip(reference, rankings)]
+            result[f"recall_vs_reference_at_{args.top_k}"] = round(statistics.mean(overlap), 4)
+        results.append(result)
+        print(json.dumps(result, ensure_ascii=False))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"reference": args.backend[0], "results": results}, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Recuperación densa vs híbrida (BM25 + vectores con reciprocal rank fusion):
+recall@k y latencia por consulta, con el mismo índice BM25 y la misma fusión que usa /query.
+
+Uso:
+    python -m benchmarks.hybrid_retrieval \
+        --embedding huggingface:hkunlp/instructor-base \
+        --pdf-dir uploads --output bench_hybrid.json
+
+Se evalúan dos tipos de consulta:
+- "exact": un término exacto que aparece en un solo chunk (código de contrato o de producto).
+- "semantic": una frase tomada del chunk, como en benchmarks.embedding_backends.
+Para cada una se reporta el modo denso (top-k por coseno), el denso con el umbral
+SIMILARITY_THRESHOLD que aplica /query, y el híbrido.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.embedding_backends import build_backend, load_chunks, make_queries
+
+EXACT_TERM = re.compile(r"\b(?=[\w-]*\d)[A-Z][\w-]{3,}\b")
+
+
+def synthetic_chunks(count, seed=0):
+    """Corpus sintético: cada chunk tiene un código de contrato y uno de producto propios."""
+    rng = random.Random(seed)
+    names = ["Andrea Molina", "Tomás Herrera", "Lucía Pardo", "Martín Rojas", "Sofía Quiroga", "Diego Salas"]
+    words = ["cliente", "pago", "plazo", "servicio", "riesgo", "versión", "entrega", "garantía", "soporte", "multa"]
+    return [
+        f"Contrato CT-{2020 + i % 5}-{i:05d} con {rng.choice(names)} por el producto PRD-{rng.randrange(10**5):05d}. "
+        + " ".join(rng.choice(words) for _ in range(100))
+        for i in range(count)
+    ]
+
+
+def exact_queries(chunks, count, seed=0):
+    """(término exacto, índice del chunk) para términos que aparecen en un único chunk."""
+    occurrences = {}
+    for i, chunk in enumerate(chunks):
+        for term in set(EXACT_TERM.findall(chunk)):
+            occurrences.setdefault(term, []).append(i)
+    unique = [(term, hits[0]) for term, hits in occurrences.items() if len(hits) == 1]
+    rng = random.Random(seed)
+    return rng.sample(unique, min(count, len(unique)))
+
+
+def evaluate(queries, model, doc_vectors, bm25, top_k, threshold):
+    from app.services.query_service import reciprocal_rank_fusion
+
+    modes = {"dense": [], "dense_threshold": [], "hybrid": []}
+    latencies = {mode: [] for mode in modes}
+    for text, target in queries:
+        start = time.perf_counter()
+        vector = np.asarray(model.get_query_embedding(text), dtype=np.float32)
+        scores = doc_vectors @ (vector / max(np.linalg.norm(vector), 1e-12))
+        ranking = np.argsort(-scores)[:top_k].tolist()
+        dense_ms = (time.perf_counter() - start) * 1000
+        above = [i for i in ranking if scores[i] >= threshold]
+
+        start = time.perf_counter()
+        sparse = [int(node_id) for node_id, _ in bm25.search(text, top_k=top_k)]
+        fused = [int(node_id) for node_id, _ in reciprocal_rank_fusion([[str(i) for i in above], [str(i) for i in sparse]])]
+        hybrid_ms = dense_ms + (time.perf_counter() - start) * 1000
+
+        for mode, result, ms in (("dense", ranking, dense_ms), ("dense_threshold", above, dense_ms), ("hybrid", fused[:top_k], hybrid_ms)):
+            modes[mode].append(target in result)
+            latencies[mode].append(ms)
+
+    return {
+        mode: {
+            f"recall_at_{top_k}": round(sum(hits) / len(hits), 4) if hits else None,
+            "latency_ms_p50": round(statistics.median(latencies[mode]), 2) if hits else None,
+            "latency_ms_p95": round(float(np.percentile(latencies[mode], 95)), 2) if hits else None,
+        }
+        for mode, hits in modes.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--embedding", default=None, help="proveedor:modelo (por defecto EMBEDDING_PROVIDER:EMBEDDING_MODEL)")
+    parser.add_argument("--pdf-dir", default=None)
+    parser.add_argument("--chunks", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    from app.config import EMBEDDING_PROVIDER, EMBEDDING_MODEL
+    from app.services.bm25_index import BM25Index
+    from app.services.query_service import SIMILARITY_THRESHOLD
+
+    chunks = load_chunks(args.pdf_dir, args.chunks) if args.pdf_dir else synthetic_chunks(args.chunks)
+    model = build_backend(args.embedding or f"{EMBEDDING_PROVIDER}:{EMBEDDING_MODEL}", args.threads)
+
+    doc_vectors = np.asarray(model.get_text_embedding_batch(chunks), dtype=np.float32)
+    doc_vectors /= np.clip(np.linalg.norm(doc_vectors, axis=1, keepdims=True), 1e-12, None)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bm25 = BM25Index(os.path.join(tmp, "bm25.sqlite"))
+        start = time.perf_counter()
+        bm25.add("benchmark", [(str(i), chunk) for i, chunk in enumerate(chunks)])
+        bm25_seconds = time.perf_counter() - start
+
+        results = {
+            "embedding": args.embedding or f"{EMBEDDING_PROVIDER}:{EMBEDDING_MODEL}",
+            "chunks": len(chunks),
+            "top_k": args.top_k,
+            "similarity_threshold": SIMILARITY_THRESHOLD,
+            "bm25_index_seconds": round(bm25_seconds, 3),
+        }
+        for kind, queries in (("exact", exact_queries(chunks, args.queries)), ("semantic", make_queries(chunks, args.queries))):
+            results[kind] = {"queries": len(queries), **evaluate(queries, model, doc_vectors, bm25, args.top_k, SIMILARITY_THRESHOLD)}
+            print(json.dumps({kind: results[kind]}, ensure_ascii=False))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+Chequeo de regresión del parser de PDFs: compara lo que genera `pdf_parser.iter_pages`
+(recorrido propio del árbol de páginas, sin aplanarlo) contra `PdfReader.pages` y
+`PdfReader.page_labels` de pypdf, página por página: id, texto, page_label y page_number.
+
+Uso:
+    python -m benchmarks.pdf_parser_check --pages 600 --span 50
+    python -m benchmarks.pdf_parser_check --pdf uploads/a.pdf --pdf uploads/b.pdf
+
+Sin --pdf se generan dos PDFs sintéticos: uno con el árbol de páginas plano (como el de
+benchmarks.app_suite) y otro anidado, con /Resources y /MediaBox heredados de los nodos
+intermedios y /PageLabels con numeración romana, con prefijo y decimal. Cada PDF se recorre:
+- entero, con un reader propio;
+- por tramos de `--span` páginas con el reader compartido, en orden y en orden inverso
+  (como los reparten los workers de parseo);
+- entero otra vez sin pypdf._page_labels (el fallback a reader.page_labels).
+Termina con código 1 si alguna página difiere.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+from benchmarks.app_suite import make_pdf
+
+
+def make_nested_pdf(pages, fanout=4):
+    """PDF con el árbol de páginas anidado (`fanout` hijos por nodo) y atributos heredados."""
+    objects = {1: "<< /Type /Catalog /Pages 2 0 R /PageLabels 3 0 R >>"}
+    font_id = 4
+    objects[3] = (
+        "<< /Nums [0 << /S /r >> 3 << /S /D /P (A-) >> "
+        f"{min(10, pages)} << /S /D /St 1 >>] >>"
+    )
+    objects[font_id] = "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"
+    next_id = [font_id + 1]
+
+    def new_id():
+        next_id[0] += 1
+        return next_id[0] - 1
+
+    def build(first, count, number, parent):
+        # Nodo intermedio: reparte [first, first + count) entre `fanout` hijos
+        if count <= fanout:
+            kids = []
+            for i in range(first, first + count):
+                page_id, content_id = new_id(), new_id()
+                stream = f"BT /F1 9 Tf 40 800 Td (Pagina {i + 1} del arbol anidado) Tj ET"
+                objects[page_id] = f"<< /Type /Page /Parent {number} 0 R /Contents {content_id} 0 R >>"
+                objects[content_id] = f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream"
+                kids.append(page_id)
+        else:
+            size = -(-count // fanout)
+            kids = []
+            for start in range(first, first + count, size):
+                child = new_id()
+                build(start, min(size, first + count - start), child, number)
+                kids.append(child)
+        inherited = "/Resources << /Font << /F1 4 0 R >> >> /MediaBox [0 0 612 842] " if parent is None else ""
+        parent_ref = f"/Parent {parent} 0 R " if parent is not None else ""
+        objects[number] = (
+            f"<< /Type /Pages {parent_ref}{inherited}/Kids [{' '.join(f'{kid} 0 R' for kid in kids)}] /Count {count} >>"
+        )
+
+    build(0, pages, 2, None)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for number in sorted(objects):
+        offsets[number] = len(out)
+        out += f"{number} 0 obj\n{objects[number]}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    size = max(objects) + 1
+    out += f"xref\n0 {size}\n0000000000 65535 f \n".encode()
+    for number in range(1, size):
+        out += f"{offsets[number]:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {size} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+def expected_pages(path):
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    labels = reader.page_labels
+    return [(page.extract_text() or "", labels[i]) for i, page in enumerate(reader.pages)]
+
+
+def compare(expected, docs, label):
+    """Diferencias entre las páginas esperadas y los Document generados (lista de strings)."""
+    errors = []
+    for doc in docs:
+        i = doc.metadata["page_number"] - 1
+        if doc.id_ != f"check-{i}":
+            errors.append(f"{label}: página {i}: id {doc.id_!r}")
+        if not 0 <= i < len(expected):
+            errors.append(f"{label}: página {i} fuera de rango")
+            continue
+        text, page_label = expected[i]
+        if doc.text != text:
+            errors.append(f"{label}: página {i}: el texto difiere")
+        if doc.metadata["page_label"] != page_label:
+            errors.append(f"{label}: página {i}: page_label {doc.metadata['page_label']!r} != {page_label!r}")
+    seen = sorted(doc.metadata["page_number"] for doc in docs)
+    if seen != list(range(1, len(expected) + 1)):
+        errors.append(f"{label}: se generaron {len(seen)} páginas de {len(expected)}")
+    return errors
+
+
+def check_pdf(path, span):
+    from app.services.pdf_parser import iter_pages
+
+    expected = expected_pages(path)
+    errors = compare(expected, list(iter_pages(path, "check")), "completo")
+
+    starts = list(range(0, len(expected), span))
+    for order, label in ((starts, "tramos en orden"), (starts[::-1], "tramos en orden inverso")):
+        docs = []
+        for start in order:
+            docs.extend(iter_pages(path, "check", start, start + span, reuse_reader=True))
+        errors += compare(expected, docs, label)
+
+    # Sin el helper privado de pypdf: `from pypdf._page_labels import ...` falla con ImportError
+    private = sys.modules.get("pypdf._page_labels")
+    sys.modules["pypdf._page_labels"] = None
+    try:
+        errors += compare(expected, list(iter_pages(path, "check")), "sin pypdf._page_labels")
+    finally:
+        sys.modules["pypdf._page_labels"] = private
+
+    # Etiquetas que no son el número de página (romanas, con prefijo, ...): las que más fácil se rompen
+    custom = [page_label for i, (_, page_label) in enumerate(expected) if page_label != str(i + 1)]
+    return {"pdf": path, "pages": len(expected), "custom_labels": len(custom), "labels_sample": custom[:5], "errors": errors}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", action="append", default=[], help="PDF a verificar (repetible)")
+    parser.add_argument("--pages", type=int, default=600, help="páginas de los PDFs sintéticos")
+    parser.add_argument("--fanout", type=int, default=4, help="hijos por nodo del árbol anidado")
+    parser.add_argument("--span", type=int, default=50, help="páginas por tramo (como PARSE_PAGES_PER_TASK)")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = list(args.pdf)
+        if not paths:
+            synthetic = {
+                "flat.pdf": make_pdf([f"Pagina {i + 1} del arbol plano" for i in range(args.pages)]),
+                "nested.pdf": make_nested_pdf(args.pages, args.fanout),
+            }
+            for name, data in synthetic.items():
+                path = os.path.join(tmp, name)
+                with open(path, "wb") as f:
+                    f.write(data)
+                paths.append(path)
+
+        results = []
+        for path in paths:
+            result = check_pdf(path, args.span)
+            results.append(result)
+            status = "ok" if not result["errors"] else f"{len(result['errors'])} diferencias"
+            print(
+                f"{os.path.basename(path)}: {result['pages']} páginas, {result['custom_labels']} etiquetas propias "
+                f"{result['labels_sample']}: {status}"
+            )
+            for error in result["errors"][:20]:
+                print(f"  {error}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    sys.exit(1 if any(result["errors"] for result in results) else 0)
+
+
+if __name__ == "__main__":
+    main()